@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# Names in the grao.bg and mon.bg sources which differ from nsi.bg
+
+import sys
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import create_engine
+from models import NameAlias, PlaceAlias
+
+
+# Input files and the tables filled from them, see infobg.py
+SOURCES = []
+TABLES = [NameAlias, PlaceAlias]
+
+
+RENAMED = [ ('марикостеново', 'марикостиново'),
+    ('палатник', 'палатик'),
+    ('вълчидол', 'вълчи дол'),
+    ('мосомиша', 'мосомище'),
+    ('мусомиша', 'мосомище'),
+    ('мусомишо', 'мосомище'),
+    ('санстефано', 'сан-стефано'),
+    ('екзарх-антимово', 'екзарх антимово'),
+    ('бобовдол', 'бобов дол'),
+    ('в.търново', 'велико търново'),
+    ('генерал-тошево', 'генерал тошево'),
+    ('георги-дамяново', 'георги дамяново'),
+    ('софийска', 'софия'),
+    ('никола-козлево', 'никола козлево'),
+    ('добричка', 'добрич-селска'),
+    ('генерал тошово', 'генерал тошево'),
+    ('стефан-караджово', 'стефан караджово'),
+    ('панайот-волово', 'панайот волово'),
+    ('капитан петко войво', 'капитан петко войвода'),
+    ('георги-добрево', 'георги добрево'),
+    ('колю-мариново', 'колю мариново'),
+    ('полковник серафимов', 'полковник серафимово'),
+    ('полковник ламбринов', 'полковник ламбриново'),
+    ('полско косово', 'полско косово'),
+    ('генерал-кантарджиев', 'генерал кантарджиево'),
+    ('любен-каравелово', 'любен каравелово'),
+    ('поликрайще', 'поликраище'),
+    ('ефрейтор-бакалово', 'ефрейтор бакалово'),
+    ('генерал-киселово', 'генерал киселово'),
+    ('фелдфебел-дяинково', 'фелдфебел денково'),
+    ('захари-стояново', 'захари стояново'),
+    ('уручовци', 'уручевоци'),
+    ('поручик-кърджиево', 'поручик кърджиево'),
+    ('полковник-свещарово', 'полковник свещарово'),
+    ('генерал-колево', 'генерал колево'),
+    ('александър стамболи', 'александър стамболийски'),
+    ('киселичево', 'киселчово'),
+    ('иван-шишманово', 'иван шишманово'),
+    ('славейино', 'славейково'),
+    ('равнина', 'ровино'),
+    ('полковник-серафимов', 'полковник серафимово'),
+    ('орешица', 'орешец'),
+    ('кокорково', 'кокорово'),
+    ('вълчадол', 'вълчан дол'),
+    ('графитово', 'графитово'),
+    ('професор-иширково', 'професор иширково'),
+    ('полковник-ламбринов', 'полковник ламбриново'),
+    ('полковник-чолаково', 'полковник чолаково'),
+    ('полковник-таслаково', 'полковник таслаково'),
+    # mon.bg
+    ('софия-област', 'софия'),
+    ('софия-град', 'софия (столица)'),
+]
+
+# (district, municipality, settlement) -> (district, municipality), None
+# keeps the name. A missing settlement stands for the whole municipality.
+MOVED = [
+    (('София', 'Столична', None), ('София (столица)', None)),
+    (('Добрич', 'Добрич', None), (None, 'Добрич-селска')),
+    (('Добрич', 'Добрич-град', None), (None, 'Добрич')),
+    (('Смолян', 'Лъки', None), ('Пловдив', None)),
+    (('Русе', 'Ветово', 'Топчии'), ('Разград', 'Разград')),
+    (('Враца', 'Кнежа', None), ('Плевен', None)),
+    ((None, None, 'Чубрика'), ('Кърджали', 'Ардино')),
+    ((None, None, 'Ябълковец'), ('Кърджали', 'Ардино')),
+]
+
+
+class Aliases:
+    """
+    NameAlias and PlaceAlias in dictionaries. Holds no session, so it can
+    be handed to worker processes.
+    """
+
+    def __init__(self, session: Session):
+
+        # alias -> name
+        self.names = dict(session.execute(select(NameAlias.alias, NameAlias.name)).all())
+
+        # (district, municipality, settlement) -> (district, municipality)
+        self.places = {}
+        for p in session.scalars(select(PlaceAlias)):
+            self.places[(p.district, p.municipality, p.settlement)] = (p.new_district, p.new_municipality)
+
+    def name(self, name: str) -> str:
+        """ NSI spelling of a lower case name, capitalized """
+
+        return self.names.get(name, name).lower().capitalize()
+
+    def place(self, dist_name: str | None, mun_name: str | None, town_name: str | None) -> tuple:
+        """ District and municipality of a settlement as NSI names them """
+
+        new = self.places.get((dist_name, mun_name, town_name)) or \
+            self.places.get((dist_name, mun_name, None))
+        if new is None:
+            return dist_name, mun_name
+
+        return new[0] or dist_name, new[1] or mun_name
+
+
+def load(session: Session) -> int:
+
+    rows = [NameAlias(alias=alias, name=name) for alias, name in RENAMED]
+    for (d_name, m_name, s_name), (new_d_name, new_m_name) in MOVED:
+        rows.append(PlaceAlias(district=d_name, municipality=m_name, settlement=s_name,
+                               new_district=new_d_name, new_municipality=new_m_name))
+
+    session.add_all(rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+
+    engine = create_engine(bulk=True)
+
+    with Session(engine) as session:
+
+        if not load(session):
+            sys.exit(0)
+        session.commit()
+
+        aliases = Aliases(session)
+        print(aliases.name('в.търново'), aliases.place('Русе', 'Ветово', 'Топчии'))
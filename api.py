@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+# Read-only REST service over the loaded tables, for clients which know
+# what they ask and need no LLM for it
+
+import hashlib
+import json
+import threading
+from datetime import date
+
+import uvicorn
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import select, func, table, column
+
+from database import create_engine, DataVersion, VERSION_SECONDS
+from models import District, Municipality, Settlement
+from models import Institution, InstitutionFinancing, InstitutionDetails, InstitutionStatus
+from models import SchoolFact, SettlementYearFact
+
+
+# Answers kept in memory, and for how long
+CACHE_ITEMS = 10000
+CACHE_SECONDS = 600
+
+MAX_LIMIT = 1000
+
+engine = create_engine()
+app = FastAPI(title='infobg', description='Данни за населените места и училищата в България')
+
+_cache = TTLCache(maxsize=CACHE_ITEMS, ttl=CACHE_SECONDS)
+_version = DataVersion(engine)
+_lock = threading.Lock()
+
+
+class InstitutionProfile(BaseModel):
+    code: str
+    name: str
+    settlement_id: int | None
+    settlement: str | None
+    municipality_code: str | None
+    municipality: str | None
+    district: str | None
+    financing: str | None
+    details: str | None
+    status: str | None
+
+
+class ExamResult(BaseModel):
+    date: date
+    year: int
+    subject: str
+    grade: int | None
+    score: float | None
+    students: int | None
+
+
+class PopulationPoint(BaseModel):
+    date: date
+    year: int
+    permanent: int | None
+    current: int | None
+
+
+class Demography(BaseModel):
+    year: int
+    ethnic_bulgarians: int | None
+    ethnic_turks: int | None
+    ethnic_roma: int | None
+    ethnic_other: int | None
+    tongue_bulgarian: int | None
+    tongue_turkish: int | None
+    tongue_romani: int | None
+    tongue_other: int | None
+    orthodox: int | None
+    muslims: int | None
+    judean: int | None
+    religion_other: int | None
+    religion_none: int | None
+
+
+class ExamPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: list[ExamResult]
+
+
+class PopulationPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: list[PopulationPoint]
+
+
+class DemographyPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: list[Demography]
+
+
+# The materialized view of views.py, a plain table in a SQLite snapshot
+municipality_demography = table('municipality_demography', column('municipality_id'),
+                                *(column(name) for name in Demography.model_fields))
+
+
+def _cached(request: Request, response: Response, key: tuple, query):
+    """
+    The result of query(), computed once per key and data version. The
+    response gets an ETag, a request which already has it gets 304.
+    """
+
+    key = (_version(),) + key
+    with _lock:
+        hit = _cache.get(key)
+
+    if hit is None:
+        with engine.connect() as conn:
+            body = query(conn)
+        digest = hashlib.sha256(json.dumps(body, default=str, sort_keys=True).encode('utf-8'))
+        hit = (f'"{key[0]}-{digest.hexdigest()[:16]}"', body)
+        with _lock:
+            _cache[key] = hit
+
+    etag, body = hit
+    headers = {'ETag': etag, 'Cache-Control': f'max-age={VERSION_SECONDS}'}
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return body
+
+
+def _page(conn, query, offset: int, limit: int) -> dict:
+
+    total = conn.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    rows = conn.execute(query.offset(offset).limit(limit)).mappings().all()
+    return {'total': total, 'offset': offset, 'limit': limit, 'items': [dict(r) for r in rows]}
+
+
+@app.get('/institutions/{code}', response_model=InstitutionProfile)
+def institution(code: str, request: Request, response: Response):
+    """ Учебно заведение по кода му в регистъра на МОН """
+
+    def _query(conn):
+        row = conn.execute(
+            select(Institution.code, Institution.name,
+                   Settlement.id.label('settlement_id'), Settlement.name.label('settlement'),
+                   Municipality.abbrev.label('municipality_code'), Municipality.name.label('municipality'),
+                   District.name.label('district'),
+                   InstitutionFinancing.label.label('financing'),
+                   InstitutionDetails.label.label('details'),
+                   InstitutionStatus.label.label('status'))
+            .outerjoin(Settlement, Settlement.id == Institution.settlement_id)
+            .outerjoin(Municipality, Municipality.id == Settlement.municipality_id)
+            .outerjoin(District, District.id == Municipality.district_id)
+            .outerjoin(InstitutionFinancing, InstitutionFinancing.id == Institution.financing_id)
+            .outerjoin(InstitutionDetails, InstitutionDetails.id == Institution.details_id)
+            .outerjoin(InstitutionStatus, InstitutionStatus.id == Institution.status_id)
+            .where(Institution.code == code)).mappings().first()
+        return dict(row) if row else None
+
+    result = _cached(request, response, ('institution', code), _query)
+    if result is None:
+        raise HTTPException(404, f'Няма учебно заведение с код {code}')
+    return result
+
+
+@app.get('/institutions/{code}/exams', response_model=ExamPage)
+def exams(code: str, request: Request, response: Response,
+          subject: str | None = None, year: int | None = None,
+          offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_LIMIT)):
+    """ Резултати от изпитите на учебно заведение, най-новите първи """
+
+    def _query(conn):
+        if conn.scalar(select(Institution.id).where(Institution.code == code)) is None:
+            return None
+        query = select(SchoolFact.date, SchoolFact.year, SchoolFact.subject, SchoolFact.grade,
+                       SchoolFact.score, SchoolFact.students) \
+            .where(SchoolFact.institution_code == code) \
+            .order_by(SchoolFact.date.desc(), SchoolFact.subject, SchoolFact.grade)
+        if subject is not None:
+            query = query.where(SchoolFact.subject == subject)
+        if year is not None:
+            query = query.where(SchoolFact.year == year)
+        return _page(conn, query, offset, limit)
+
+    result = _cached(request, response, ('exams', code, subject, year, offset, limit), _query)
+    if result is None:
+        raise HTTPException(404, f'Няма учебно заведение с код {code}')
+    return result
+
+
+@app.get('/settlements/{settlement_id}/population', response_model=PopulationPage)
+def population(settlement_id: int, request: Request, response: Response,
+               offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_LIMIT)):
+    """ Брой на населението на населено място по години, по кода му по ЕКАТТЕ """
+
+    def _query(conn):
+        if conn.scalar(select(Settlement.id).where(Settlement.id == settlement_id)) is None:
+            return None
+        query = select(SettlementYearFact.date, SettlementYearFact.year,
+                       SettlementYearFact.permanent, SettlementYearFact.current) \
+            .where(SettlementYearFact.settlement_id == settlement_id) \
+            .order_by(SettlementYearFact.date)
+        return _page(conn, query, offset, limit)
+
+    result = _cached(request, response, ('population', settlement_id, offset, limit), _query)
+    if result is None:
+        raise HTTPException(404, f'Няма населено място с код {settlement_id:05}')
+    return result
+
+
+@app.get('/municipalities/{abbrev}/demography', response_model=DemographyPage)
+def demography(abbrev: str, request: Request, response: Response,
+               offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_LIMIT)):
+    """ Етнически състав, майчин език и вероизповедание на община при всяко преброяване """
+
+    def _query(conn):
+        m_id = conn.scalar(select(Municipality.id).where(Municipality.abbrev == abbrev))
+        if m_id is None:
+            return None
+        view = municipality_demography
+        query = select(*(view.c[name] for name in Demography.model_fields)) \
+            .where(view.c.municipality_id == m_id) \
+            .order_by(view.c.year)
+        return _page(conn, query, offset, limit)
+
+    result = _cached(request, response, ('demography', abbrev, offset, limit), _query)
+    if result is None:
+        raise HTTPException(404, f'Няма община с код {abbrev}')
+    return result
+
+
+if __name__ == "__main__":
+
+    # Vanna.AI is on port 8000
+    uvicorn.run(app, host='localhost', port=8001)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+# Synthetic input files at a multiple of the real volume and a full build
+# on each of them.
+#
+# Real volumes grow along time: every month brings new GRAO reports, every
+# year a new EKATTE register, infostat column and exam session. So does
+# the data here. Copy k of every source is the real file with its dates k
+# times YEARS later, the rest of its bytes untouched. Settlements, schools
+# and municipalities stay the same, the loaders resolve every copy.
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from os import path
+
+
+DATA_DIR = 'data'
+BENCH_DIR = 'bench'
+SCALES = [1, 10, 100]
+
+# Longer than the dates of any source span, so no two copies share a date
+YEARS = 30
+
+URL = 'postgresql://localhost/infobg_bench'
+
+# Report date of the GRAO files, 'дата 31.12.2024' or 'ДАТА 31.12.1998'
+GRAO_DATE = re.compile(b'((?:' + 'дата'.encode('cp1251') + b'|' + 'ДАТА'.encode('cp1251') +
+                       rb') +\d\d\.\d\d\.)(\d{4})')
+
+YEAR = re.compile(r'\d{4}')
+
+
+def _copy_name(file_name: str, k: int) -> str:
+    stem, ext = path.splitext(file_name)
+    return file_name if k == 0 else f'{stem}.{k}{ext}'
+
+
+def _link(src: str, dst: str) -> None:
+    """ Unchanged copies share the blocks of the real file where possible """
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _grao(src_dir: str, dst_dir: str, scale: int) -> None:
+
+    for file_name in glob.glob(path.join(src_dir, '*')):
+        with open(file_name, 'rb') as file:
+            data = file.read()
+
+        for k in range(scale):
+            years = YEARS * k
+            copy = GRAO_DATE.sub(lambda m: m.group(1) + str(int(m.group(2)) + years).encode(), data)
+            with open(path.join(dst_dir, _copy_name(path.basename(file_name), k)), 'wb') as file:
+                file.write(copy)
+
+
+def _nsi(src_dir: str, dst_dir: str, scale: int) -> None:
+
+    # One register per year, the loaders keep the first of every code
+    for year_dir in glob.glob(path.join(src_dir, '*')):
+        for k in range(scale):
+            copy_dir = path.join(dst_dir, _copy_name(path.basename(year_dir), k))
+            os.makedirs(copy_dir)
+            for file_name in glob.glob(path.join(year_dir, '*')):
+                _link(file_name, path.join(copy_dir, path.basename(file_name)))
+
+
+def _infostat_lines(lines: list, scale: int) -> list:
+    """ Value columns repeated scale times, the years in their headings moved """
+
+    cells = [line.rstrip('\r\n').removesuffix(';').split(';') for line in lines]
+
+    # Same layout as infostat.read_table()
+    first = next(c for c in cells if any(c))
+    n_labels = 0
+    while n_labels < len(first) and not first[n_labels]:
+        n_labels += 1
+
+    result = []
+    heading = True
+    for line, row in zip(lines, cells):
+        if not any(row):
+            result.append(line)
+            continue
+
+        heading = heading and not row[0]
+        values = row[n_labels:]
+        for k in range(1, scale):
+            if heading:
+                values += [str(int(v) + YEARS * k) if YEAR.fullmatch(v) else v for v in row[n_labels:]]
+            else:
+                values += row[n_labels:]
+
+        body = line.rstrip('\r\n')
+        end = ';' if body.endswith(';') else ''
+        result.append(';'.join(row[:n_labels] + values) + end + line[len(body):])
+
+    return result
+
+
+def _infostat(src_dir: str, dst_dir: str, scale: int) -> None:
+
+    for file_name in glob.glob(path.join(src_dir, '*.csv')):
+        with open(file_name, encoding='utf-8-sig', newline='') as file:
+            lines = file.readlines()
+
+        with open(path.join(dst_dir, path.basename(file_name)), 'w', encoding='utf-8-sig', newline='') as file:
+            file.writelines(_infostat_lines(lines, scale))
+
+
+def _dump_json(data, file_name: str) -> None:
+
+    # The layout of the nvoresults.com files
+    with open(file_name, 'w', encoding='utf-8', newline='\r\n') as file:
+        file.write(json.dumps(data, indent=2, separators=(',', ' : '), ensure_ascii=False))
+
+
+def _nvoresults(src_dir: str, dst_dir: str, scale: int) -> None:
+
+    def _internal(date_str: str, years: int) -> str:
+        return str(int(date_str[:4]) + years) + date_str[4:]
+
+    def _external(date_str: str, years: int) -> str:
+        tokens = date_str.split('_')
+        tokens[2] = f'{int(tokens[2]) + years:02}'
+        return '_'.join(tokens)
+
+    for file_name in glob.glob(path.join(src_dir, '*.json')):
+        _link(file_name, path.join(dst_dir, path.basename(file_name)))
+
+    name = path.join(src_dir, 'matura_results.json')
+    if path.exists(name):
+        with open(name, encoding='utf-8') as file:
+            data = json.load(file)
+        for school in data['results'].values():
+            for date_str, exams in list(school.items()):
+                for k in range(1, scale):
+                    school[_internal(date_str, YEARS * k)] = exams
+        os.remove(path.join(dst_dir, 'matura_results.json'))
+        _dump_json(data, path.join(dst_dir, 'matura_results.json'))
+
+    name = path.join(src_dir, 'results.json')
+    if path.exists(name):
+        with open(name, encoding='utf-8') as file:
+            data = json.load(file)
+        for school in data.values():
+            exams = school['exam_results']
+            for date_str, exam in list(exams.items()):
+                for k in range(1, scale):
+                    exams[_external(date_str, YEARS * k)] = exam
+        os.remove(path.join(dst_dir, 'results.json'))
+        _dump_json(data, path.join(dst_dir, 'results.json'))
+    else:
+        # Not published any more, an empty one lets scores.py run
+        _dump_json({}, path.join(dst_dir, 'results.json'))
+
+
+SOURCES = {
+    'grao.bg': _grao,
+    'nsi.bg': _nsi,
+    'infostat.nsi.bg': _infostat,
+    'nvoresults.com': _nvoresults,
+    'mon.bg': None,
+}
+
+
+def generate(scale: int, dir_name: str) -> int:
+    """ Input files for scale times the real volume under dir_name/data, returns their size """
+
+    tmp_name = f'{dir_name}.tmp'
+    shutil.rmtree(tmp_name, ignore_errors=True)
+
+    for source, make in SOURCES.items():
+        src_dir = path.join(DATA_DIR, source)
+        dst_dir = path.join(tmp_name, DATA_DIR, source)
+        os.makedirs(dst_dir)
+        if make:
+            make(src_dir, dst_dir, scale)
+        else:
+            for file_name in glob.glob(path.join(src_dir, '*')):
+                _link(file_name, path.join(dst_dir, path.basename(file_name)))
+
+    os.rename(tmp_name, dir_name)
+    return _size(dir_name)
+
+
+def _size(dir_name: str) -> int:
+    return sum(path.getsize(f) for f in glob.glob(path.join(dir_name, DATA_DIR, '**'), recursive=True)
+               if path.isfile(f))
+
+
+def run(scale: int, url: str) -> dict:
+    """ Full build of the files of scale, returns its metrics report """
+
+    dir_name = path.join(BENCH_DIR, str(scale))
+    if path.isdir(dir_name):
+        input_bytes = _size(dir_name)
+    else:
+        start = time.perf_counter()
+        input_bytes = generate(scale, dir_name)
+        print(f'{scale:>4}x {"данни":16} {time.perf_counter() - start:8.2f}s {input_bytes:14} байта')
+
+    # The parsed files of the previous run would hide the parsing time
+    shutil.rmtree(path.join(dir_name, 'cache'), ignore_errors=True)
+
+    script = path.join(path.dirname(path.abspath(__file__)), 'infobg.py')
+    with open(path.join(dir_name, 'build.log'), 'w', encoding='utf-8') as log:
+        subprocess.run([sys.executable, script, 'build', '--full', '--url', url],
+                       cwd=dir_name, stdout=log, stderr=subprocess.STDOUT, check=True)
+
+    reports = sorted(glob.glob(path.join(dir_name, 'reports', 'build-*.json')), key=path.getmtime)
+    with open(reports[-1], encoding='utf-8') as file:
+        report = json.load(file)
+
+    report['input_bytes'] = input_bytes
+    return report
+
+
+def summary(reports: dict) -> None:
+    """ Seconds and rows per second of every stage and the peak RSS of the build at every scale """
+
+    scales = list(reports)
+    names = list(reports[scales[0]]['stages'])
+
+    print(f'{"":16}' + ''.join(f' {f"{s}x":>21}' for s in scales))
+    for name in names:
+        line = f'{name:16}'
+        for scale in scales:
+            stage = reports[scale]['stages'].get(name)
+            if stage is None:
+                line += f' {"-":>21}'
+                continue
+            rate = stage['rows_per_second'] or 0
+            line += f' {stage["seconds"]:8.2f}s {rate:9}/s'
+        print(line)
+
+    print(f'{"общо":16}' + ''.join(f' {reports[s]["seconds"]:8.2f}s {"":11}' for s in scales))
+    # Of the whole build, the loaders run at the same time
+    print(f'{"памет":16}' + ''.join(f' {reports[s]["peak_rss_kb"] // 1024:19}MB' for s in scales))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog='benchmark')
+    parser.add_argument('scales', nargs='*', type=int, default=SCALES,
+                        help='колко пъти повече данни от истинските')
+    parser.add_argument('--url', default=URL,
+                        help='база данни, която се пресъздава при всяко измерване')
+    parser.add_argument('--new', action='store_true',
+                        help='генерира данните отново')
+    args = parser.parse_args()
+
+    if args.new:
+        for scale in args.scales:
+            shutil.rmtree(path.join(BENCH_DIR, str(scale)), ignore_errors=True)
+
+    started = datetime.now()
+    reports = {}
+    for scale in args.scales:
+        reports[scale] = run(scale, args.url)
+        print(f'{scale:>4}x {"build":16} {reports[scale]["seconds"]:8.2f}s')
+
+    summary(reports)
+
+    file_name = path.join(BENCH_DIR, f'benchmark-{started:%Y%m%d-%H%M%S}.json')
+    with open(file_name, 'w', encoding='utf-8') as file:
+        json.dump({'started': started.isoformat(timespec='seconds'), 'scales': reports},
+                  file, ensure_ascii=False, indent=2)
+    print(f'{"отчет":21} {file_name}')
@@ -1,20 +1,3 @@
 
-./models.py
-./districts.py
-./municipalities.py
-./locations.py
-
-./details.py
-./finance.py
-./transform.py
-./institutions.py
-
-./subjects.py
-./scores.py
-
-./religion.py
-./language.py
-./ethnicity.py
-./census.py
-./education7+.py
-./literacy.py
+# Loaders and their dependencies are listed in infobg.py
+./infobg.py build "$@"
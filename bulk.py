@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+import csv
+import io
+import struct
+import time
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import insert, select, text
+from sqlalchemy import Integer, String, Date, Numeric, Float
+from sqlalchemy.orm import Session
+
+from models import Moment, PARTITIONED
+import metrics
+
+
+# https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('!h', -1)
+
+PG_EPOCH = date(2000, 1, 1).toordinal()
+
+BATCH_ROWS = 10000
+
+
+def table_columns(model) -> list:
+    """
+    Names of the columns a loader has to provide for model, in table
+    order. Autoincrement primary keys are left to the database.
+    """
+
+    return [c.name for c in model.__table__.columns if c.autoincrement is not True]
+
+
+def _numeric(value) -> bytes:
+
+    d = Decimal(str(value))
+    sign, _, exp = d.as_tuple()
+    dscale = max(0, -exp)
+
+    int_part, _, frac_part = format(abs(d), 'f').partition('.')
+    int_part = int_part.lstrip('0')
+    int_part = int_part.zfill(-(-len(int_part) // 4) * 4)
+    frac_part = frac_part + '0' * (-len(frac_part) % 4)
+
+    digits = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    digits += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+    weight = len(int_part) // 4 - 1
+
+    while digits and digits[0] == 0:
+        digits.pop(0)
+        weight -= 1
+    while digits and digits[-1] == 0:
+        digits.pop()
+    if not digits:
+        weight = 0
+
+    head = struct.pack('!hhHh', len(digits), weight, 0x4000 if sign else 0, dscale)
+    return head + struct.pack(f'!{len(digits)}h', *digits)
+
+
+def _binary_encoders(model, columns: list) -> list:
+
+    encoders = []
+    for name in columns:
+        c_type = model.__table__.columns[name].type
+        if isinstance(c_type, Integer):
+            encoders.append(lambda v: struct.pack('!i', v))
+        elif isinstance(c_type, Float):
+            # Float is a Numeric too, but double precision on the wire
+            encoders.append(lambda v: struct.pack('!d', v))
+        elif isinstance(c_type, Numeric):
+            encoders.append(_numeric)
+        elif isinstance(c_type, Date):
+            encoders.append(lambda v: struct.pack('!i', v.toordinal() - PG_EPOCH))
+        elif isinstance(c_type, String):
+            encoders.append(lambda v: str(v).encode('utf-8'))
+        else:
+            raise TypeError(f'{model.__tablename__}.{name}: {c_type} не се поддържа в двоичен COPY')
+
+    return encoders
+
+
+def _binary_chunks(model, columns: list, rows):
+
+    encoders = _binary_encoders(model, columns)
+    count = struct.pack('!h', len(columns))
+
+    yield PGCOPY_HEADER
+
+    buffer = []
+    for row in rows:
+        buffer.append(count)
+        for encode, value in zip(encoders, row):
+            if value is None:
+                buffer.append(b'\xff\xff\xff\xff')
+            else:
+                field = encode(value)
+                buffer.append(struct.pack('!i', len(field)))
+                buffer.append(field)
+
+        if len(buffer) > BATCH_ROWS * len(columns):
+            yield b''.join(buffer)
+            buffer = []
+
+    buffer.append(PGCOPY_TRAILER)
+    yield b''.join(buffer)
+
+
+def _csv_chunks(rows):
+
+    # None and '' are both written as an unquoted empty field, which COPY
+    # reads as NULL. The fact tables do not carry text columns.
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator='\n')
+
+    for num, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if num % BATCH_ROWS == 0:
+            yield text.getvalue().encode('utf-8')
+            text.seek(0)
+            text.truncate()
+
+    yield text.getvalue().encode('utf-8')
+
+
+def _add_partitions(connection, model, date_ids: set) -> None:
+    """ Partitions for the dates which a partitioned table has none for yet """
+
+    name = model.__tablename__
+    partitioned = connection.execute(
+        text('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)'),
+        {'name': name}).first()
+    if not partitioned:
+        return
+
+    for d_id, moment in connection.execute(
+            select(Moment.id, Moment.date).where(Moment.id.in_(date_ids))):
+        connection.execute(text(f'CREATE TABLE IF NOT EXISTS {name}_{moment:%Y_%m_%d} '
+                                f'PARTITION OF {name} FOR VALUES IN ({int(d_id)})'))
+
+
+class _ChunkReader(io.RawIOBase):
+    """ File object over a chunk generator, for psycopg2 copy_expert() """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b''
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+@metrics.phase('write')
+def copy_rows(session: Session, model, rows, binary: bool = True) -> int:
+    """
+    Write rows, plain tuples ordered as table_columns(model), into the
+    table of model with COPY FROM STDIN inside the current transaction
+    of session. Other databases get a plain executemany INSERT.
+    """
+
+    columns = table_columns(model)
+    total = 0
+
+    def _counted(rows):
+        nonlocal total
+        for row in rows:
+            total += 1
+            yield row
+
+    connection = session.connection()
+    if connection.dialect.name != 'postgresql':
+        stmt = insert(model.__table__)
+        batch = []
+        for row in _counted(rows):
+            batch.append(dict(zip(columns, row)))
+            if len(batch) == BATCH_ROWS:
+                connection.execute(stmt, batch)
+                batch = []
+        if batch:
+            connection.execute(stmt, batch)
+        return total
+
+    if model.__tablename__ in PARTITIONED:
+        rows = list(rows)
+        d_pos = columns.index('date_id')
+        _add_partitions(connection, model, {row[d_pos] for row in rows})
+
+    preparer = connection.dialect.identifier_preparer
+    table = preparer.format_table(model.__table__)
+    names = ', '.join(preparer.quote(c) for c in columns)
+    if binary:
+        sql = f'COPY {table} ({names}) FROM STDIN (FORMAT BINARY)'
+        chunks = _binary_chunks(model, columns, _counted(rows))
+    else:
+        sql = f'COPY {table} ({names}) FROM STDIN (FORMAT CSV)'
+        chunks = _csv_chunks(_counted(rows))
+
+    start = time.perf_counter()
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(sql, io.BufferedReader(_ChunkReader(chunks), 1 << 16))
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                for chunk in chunks:
+                    copy.write(chunk)
+    finally:
+        cursor.close()
+
+    # COPY goes around the engine, so its events do not see it
+    metrics.statement(model.__tablename__, time.perf_counter() - start)
+
+    return total
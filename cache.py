@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# Parsed input files, kept between builds
+
+import glob
+import hashlib
+import os
+import shutil
+from os import path
+
+import numpy as np
+
+import metrics
+
+CACHE_DIR = 'cache'
+
+
+def _digest(file_names: list) -> str:
+
+    h = hashlib.sha256()
+    for file_name in file_names:
+        with open(file_name, 'rb') as file:
+            while chunk := file.read(1 << 20):
+                h.update(chunk)
+
+    return h.hexdigest()[:16]
+
+
+def _save(dir_name: str, columns: dict) -> None:
+
+    for name, column in columns.items():
+        if isinstance(column, list):
+            # Strings as one UTF-8 buffer, every one terminated with '\0'
+            data = ''.join(s + '\0' for s in column).encode('utf-8')
+            np.save(path.join(dir_name, f'{name}.str.npy'), np.frombuffer(data, dtype=np.uint8))
+        else:
+            np.save(path.join(dir_name, f'{name}.npy'), column)
+
+
+def _open(dir_name: str) -> dict:
+
+    columns = {}
+    for file_name in glob.glob(path.join(dir_name, '*.npy')):
+        name = path.basename(file_name).removesuffix('.npy')
+        column = np.load(file_name, mmap_mode='r')
+        if name.endswith('.str'):
+            columns[name.removesuffix('.str')] = bytes(column).decode('utf-8').split('\0')[:-1]
+        else:
+            columns[name] = column
+
+    return columns
+
+
+@metrics.phase('parse')
+def columns(file_name: str, parse, code: str) -> dict:
+    """
+    Columns parsed from file_name by parse(file_name), a dictionary with
+    a NumPy array or a list of strings per column.
+
+    They are saved as .npy files in a directory of CACHE_DIR named after
+    the SHA-256 of file_name and of code, the script with the parser.
+    Later calls memory-map the arrays from there instead of parsing the
+    file again, until one of the two changes.
+    """
+
+    base = path.join(CACHE_DIR, path.basename(file_name))
+    dir_name = f'{base}.{_digest([file_name, code])}'
+
+    if path.isdir(dir_name):
+        return _open(dir_name)
+
+    result = parse(file_name)
+
+    # Written aside and renamed, so other processes never see half of it
+    tmp_name = f'{dir_name}.{os.getpid()}.tmp'
+    os.makedirs(tmp_name, exist_ok=True)
+    _save(tmp_name, result)
+
+    for old in glob.glob(f'{glob.escape(base)}.*'):
+        if old != tmp_name and not old.endswith('.tmp'):
+            shutil.rmtree(old, ignore_errors=True)
+
+    try:
+        os.rename(tmp_name, dir_name)
+    except OSError:
+        shutil.rmtree(tmp_name, ignore_errors=True)
+
+    return result
@@ -3,268 +3,205 @@
 # grao.bg
 
 import glob
+import multiprocessing
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
+from functools import partial
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from models import Census, Moment, District, Municipality, Settlement
+from database import create_engine
+from models import Census
+from lookup import Lookup
+from bulk import copy_rows
+from grao import records, tadr_records, ROW
+from aliases import Aliases
+import metrics
 
 
 DATA_DIR = 'data/grao.bg'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [f'{DATA_DIR}/tadr*20*']
+TABLES = [Census]
 
-RENAMED = [ ('марикостеново', 'марикостиново'),
-    ('палатник', 'палатик'),
-    ('вълчидол', 'вълчи дол'),
-    ('мосомиша', 'мосомище'),
-    ('мусомиша', 'мосомище'),
-    ('мусомишо', 'мосомище'),
-    ('санстефано', 'сан-стефано'),
-    ('екзарх-антимово', 'екзарх антимово'),
-    ('бобовдол', 'бобов дол'),
-    ('в.търново', 'велико търново'),
-    ('генерал-тошево', 'генерал тошево'),
-    ('георги-дамяново', 'георги дамяново'),
-    ('софийска', 'софия'),
-    ('никола-козлево', 'никола козлево'),
-    ('добричка', 'добрич-селска'),
-    ('генерал тошово', 'генерал тошево'),
-    ('стефан-караджово', 'стефан караджово'),
-    ('панайот-волово', 'панайот волово'),
-    ('капитан петко войво', 'капитан петко войвода'),
-    ('георги-добрево', 'георги добрево'),
-    ('колю-мариново', 'колю мариново'),
-    ('полковник серафимов', 'полковник серафимово'),
-    ('полковник ламбринов', 'полковник ламбриново'),
-    ('полско косово', 'полско косово'),
-    ('генерал-кантарджиев', 'генерал кантарджиево'),
-    ('любен-каравелово', 'любен каравелово'),
-    ('поликрайще', 'поликраище'),
-    ('ефрейтор-бакалово', 'ефрейтор бакалово'),
-    ('генерал-киселово', 'генерал киселово'),
-    ('фелдфебел-дяинково', 'фелдфебел денково'),
-    ('захари-стояново', 'захари стояново'),
-    ('уручовци', 'уручевоци'),
-    ('поручик-кърджиево', 'поручик кърджиево'),
-    ('полковник-свещарово', 'полковник свещарово'),
-    ('генерал-колево', 'генерал колево'),
-    ('александър стамболи', 'александър стамболийски'),
-    ('киселичево', 'киселчово'),
-    ('иван-шишманово', 'иван шишманово'),
-    ('славейино', 'славейково'),
-    ('равнина', 'ровино'),
-    ('полковник-серафимов', 'полковник серафимово'),
-    ('орешица', 'орешец'),
-    ('кокорково', 'кокорово'),
-    ('вълчадол', 'вълчан дол'),
-    ('графитово', 'графитово'),
-    ('професор-иширково', 'професор иширково'),
-    ('полковник-ламбринов', 'полковник ламбриново'),
-    ('полковник-чолаково', 'полковник чолаково'),
-    ('полковник-таслаково', 'полковник таслаково'),
-]
-
-
-def _name_check(name: str) -> str:
-    for tup in RENAMED:
-        if name == tup[0]:
-            name = tup[1]
-
-    return name.lower().capitalize()
-
-
-
-def _cleanup_lines(file_name: str):
-
-    old_lines = []
-    with open(file_name, encoding='windows-1251') as txt_file:
-        try:
-            num = 0
-            for num, line in enumerate(txt_file):
-                old_lines.append(line)
-        except UnicodeDecodeError as err:
-            print(f'{file_name}:{num}:{err}')
-            return old_lines
-
-    new_lines = []
-    for num, line in enumerate(old_lines):
-
-        if 'ЬО' in line:
-            new_lines.append(line)
-            continue
 
-        if 'Ь' in line:
-            line = line.replace('Ь', 'Ъ')
+def _process_header(line: str, dist_name, mun_name, census_date, aliases: Aliases) -> tuple:
 
-        new_lines.append(line)
+    if 'дата' in line:
+        tokens = line.split()
+        if 'водата' in line or 'пирамидата' in line:
+            pass
+        else:
+            d_str = tokens[1]
+            try:
+                census_date = date.strptime(d_str, "%d.%m.%Y")
+                dist_name = None
+                mun_name = None
+            except ValueError:
+                pass
 
-    return new_lines
+    if 'всичко за общината'.lower() in line:
+        census_date = None
 
+    # 1998
+    if 'област:' in line:
+        line = line.removesuffix('Т А Б Л И Ц А'.lower()).strip()
+        tokens = line.split(':')
+        tokens = [t.strip() for t in tokens]
+        dist_name = aliases.name(tokens[1])
 
-def _process_one_year(file_name: str, session: Session, strict=False) -> list:
+    # 1998
+    if 'община:' in line:
+        line = line.removesuffix('на населението по постоянен и настоящ адрес').strip()
+        line = line.removesuffix('на населението по адрес и местожителство').strip()
+        tokens = line.split(':')
+        tokens = [t.strip() for t in tokens]
+        mun_name = aliases.name(tokens[1])
 
-    lines = _cleanup_lines(file_name)
+    if 'област' in line and 'община' in line:
 
-    population = []
+        d_offs = line.index('област')
+        m_offs = line.index('община')
+
+        dist_name = line[d_offs + len('област'):m_offs].strip()
+        mun_name = line[m_offs + len('община'):].strip()
+
+        dist_name = aliases.name(dist_name)
+        mun_name = aliases.name(mun_name)
+
+    return dist_name, mun_name, census_date
+
+
+def _parse_one_year(file_name: str, aliases: Aliases) -> list:
+    """
+    Parse one tadr file into plain (num, date, district, municipality,
+    settlement, numbers) rows. Needs no database, so it can run in a
+    worker process.
+    """
+
+    rows = []
     dist_name = None
     mun_name = None
     census_date = None
-    for num, line in enumerate(lines):
-
-        line = line.lower().strip()
+    for record in records(tadr_records, file_name):
 
-        if 'дата' in line:
-            tokens = line.split()
-            if 'водата' in line or 'пирамидата' in line:
-                pass
-            else:
-                d_str = tokens[1]
-                try:
-                    census_date = date.strptime(d_str, "%d.%m.%Y")
-                    dist_name = None
-                    mun_name = None
-                except ValueError:
-                    pass
-
-        if 'всичко за общината'.lower() in line:
-            census_date = None
-
-        # 1998
-        if 'област:' in line:
-            line = line.removesuffix('Т А Б Л И Ц А'.lower()).strip()
-            tokens = line.split(':')
-            tokens = [t.strip() for t in tokens]
-            dist_name = _name_check(tokens[1])
-
-        # 1998
-        if 'община:' in line:
-            line = line.removesuffix('на населението по постоянен и настоящ адрес').strip()
-            line = line.removesuffix('на населението по адрес и местожителство').strip()
-            tokens = line.split(':')
-            tokens = [t.strip() for t in tokens]
-            mun_name = _name_check(tokens[1])
-
-        if 'област' in line and 'община' in line:
-
-            d_offs = line.index('област')
-            m_offs = line.index('община')
-
-            dist_name = line[d_offs + len('област'):m_offs].strip()
-            mun_name = line[m_offs + len('община'):].strip()
-
-            dist_name = _name_check(dist_name)
-            mun_name = _name_check(mun_name)
-
-        if line.startswith('|гр') or line.startswith('|с'):
-            # Remove start and end '|' character
-            line = line.strip()[1:-1]
-            tokens = line.split('|')
-        elif line.startswith('| гр') or line.startswith('| с'):
-            # Remove start and end '|' character
-            line = line.strip()[1:-1]
-            tokens = line.split('|')
-        elif line.startswith('! гр') or line.startswith('! с'):
-            # Remove start and end '|' character
-            line = line.strip()[1:-1]
-            tokens = line.split('!')
+        if record[0] == ROW:
+            _, num, town_name, numbers = record
         else:
+            _, num, line = record
+            dist_name, mun_name, census_date = _process_header(line, dist_name, mun_name, census_date, aliases)
             continue
 
+        if not census_date:
+            rows.append((num, None, dist_name, mun_name, town_name, numbers))
+            continue
+
+        town_name = town_name.removeprefix('с.').removeprefix('гр.').strip()
+        town_name = aliases.name(town_name)
+
+        dist_name, mun_name = aliases.place(dist_name, mun_name, town_name)
+
+        rows.append((num, census_date, dist_name, mun_name, town_name, numbers))
+
+    return rows
+
+
+def _resolve_one_year(file_name: str, rows: list, lookup: Lookup, missing: set) -> list:
+
+    population = []
+    for num, census_date, dist_name, mun_name, town_name, numbers in rows:
+
         if not census_date:
             print(f'{file_name}:{num} липсва дата')
             continue
 
-        time_index = Moment.insert_date(census_date, session)
+        time_index = lookup.moment(census_date)
 
-        tokens = [t.strip() for t in tokens]
-        town_name = tokens[0].removeprefix('с.').removeprefix('гр.').strip()
-        town_name = _name_check(town_name)
-
-        # Конвертиран код с UTF-8 стрингове
-        if mun_name == 'Столична' and dist_name == 'София':
-            dist_name = 'София (столица)'
-        if mun_name == 'Столична' and dist_name == 'София':
-            dist_name = 'София (столица)'
-        elif mun_name == 'Добрич' and dist_name == 'Добрич':
-            mun_name = 'Добрич-селска'
-        elif mun_name == 'Добрич-град' and dist_name == 'Добрич':
-            mun_name = 'Добрич'
-        elif mun_name == 'Лъки' and dist_name == 'Смолян':
-            dist_name = 'Пловдив'
-        elif town_name == 'Топчии' and dist_name == 'Русе' and mun_name == 'Ветово':
-            dist_name = 'Разград'
-            mun_name = 'Разград'
-        elif mun_name == 'Кнежа' and dist_name == 'Враца':
-            dist_name = 'Плевен'
-        elif town_name == 'Чубрика' and not dist_name and not mun_name:
-            mun_name = 'Ардино'
-            dist_name = 'Кърджали'
-        elif town_name == 'Ябълковец' and not dist_name and not mun_name:
-            mun_name = 'Ардино'
-            dist_name = 'Кърджали'
-
-        d_index = session.query(District.id).filter_by(name=dist_name).first()
-        if not d_index:
+        d_index = lookup.district(dist_name)
+        if d_index is None:
             print(f'{file_name}:{num} Не намирам област {dist_name} община {mun_name} град {town_name}')
             continue
 
-        m_index = session.query(Municipality.id).filter_by(district_id=d_index[0]).filter_by(name=mun_name).first()
-        if not m_index:
+        m_index = lookup.municipality(dist_name, mun_name)
+        if m_index is None:
             print(f'{file_name}:{num} Не намирам община {mun_name} в област {dist_name}')
             continue
 
-        if 0 == int(tokens[1]) or 0 == int(tokens[2]) or 0 == int(tokens[3])  or \
-                0 == int(tokens[5]) or 0 == int(tokens[6]) or 0 == int(tokens[7]):
+        if 0 == numbers[0] or 0 == numbers[1] or 0 == numbers[2] or \
+                0 == numbers[4] or 0 == numbers[5] or 0 == numbers[6]:
             continue
 
-        permanent = int(tokens[1])
-        current = int(tokens[5])
+        permanent = numbers[0]
+        current = numbers[4]
 
-        s_index = session.query(Settlement.id).filter_by(name=town_name).filter_by(municipality_id=m_index[0]).first()
-        if not s_index:
-            print(f'{file_name}:{num:4} Не намирам селище {town_name} в област {dist_name} в община {mun_name}')
+        s_index = lookup.settlement_like(m_index, town_name)
+        if s_index is None:
+            if (m_index, town_name) not in missing:
+                missing.add((m_index, town_name))
+                print(f'{file_name}:{num:4} Не намирам селище {town_name} в област {dist_name} в община {mun_name}')
             continue
 
-        census = Census(settlement_id=s_index[0], municipality_id=m_index[0],
-                        date_id=time_index, permanent=permanent, current=current)
-
-        population.append(census)
-        pass
+        # Same order as bulk.table_columns(Census)
+        population.append((s_index, m_index, time_index, permanent, current))
 
     return population
 
 
-def _load(session: Session) -> list:
+def _load(session: Session, jobs: int = 1) -> list:
+    """
+    Parse the tadr files in parallel on up to jobs worker processes, then
+    resolve the keys of all rows in this process. jobs=1 parses them
+    one after another in this process.
+    """
 
     dir_name = DATA_DIR
 
     population = []
+    lookup = Lookup(session)
+    aliases = Aliases(session)
 
     file_names = [name for name in glob.iglob(f'{dir_name}/tadr*20*')]
     file_names.sort(reverse=True)
 
-    strict = True
-    for file_name in file_names:
-        one = _process_one_year(file_name, session, strict)
-        strict = False
+    with metrics.phase('parse'):
+        if jobs == 1:
+            parsed = [_parse_one_year(file_name, aliases) for file_name in file_names]
+        else:
+            # infobg.py runs the loaders on threads, which a fork would copy
+            # in whatever state they are
+            with ProcessPoolExecutor(max_workers=min(jobs, len(file_names) or 1),
+                                     mp_context=multiprocessing.get_context('forkserver')) as pool:
+                parsed = list(pool.map(partial(_parse_one_year, aliases=aliases), file_names))
+
+    lookup.insert_moments(row[1] for rows in parsed for row in rows if row[1])
+
+    # Each unknown settlement is reported once, not once per year
+    missing = set()
+    for file_name, rows in zip(file_names, parsed):
+        one = _resolve_one_year(file_name, rows, lookup, missing)
         population.extend(one)
 
+    metrics.rejected(sum(len(rows) for rows in parsed) - len(population))
+
     return population
 
 
+def load(session: Session, jobs: int = 1) -> int:
+
+    return copy_rows(session, Census, _load(session, jobs))
+
+
 if __name__ == "__main__":
 
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
 
-        rows = _load(session)
-        if not rows:
+        if not load(session, os.cpu_count()):
             sys.exit(0)
-
-        session.add_all(rows)
         session.commit()
 
 
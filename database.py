@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# The one place where the loaders, infobg.py and vannaai.py get their
+# engines. The settings below are the defaults, keyword arguments of
+# create_engine() override them.
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import sqlalchemy
+from sqlalchemy import event, text
+
+
+URL = os.environ.get('INFOBG_URL', 'postgresql://localhost/infobg')
+
+# Connections kept open, and how many more may be opened under load
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+
+# Rows per INSERT ... VALUES of an executemany(), and statements per round
+# trip of the other psycopg2 executemany() calls
+INSERT_PAGE_SIZE = 1000
+BATCH_PAGE_SIZE = 1000
+
+# psycopg 3 prepares a statement on the server once it has been run this
+# many times on a connection, the lookups of the loaders repeat a lot
+PREPARE_THRESHOLD = 5
+
+# Memory of one sort or hash of a session, before it spills to disk
+WORK_MEM = '64MB'
+
+# How long the data version is trusted before it is read again
+VERSION_SECONDS = 10
+
+# Seconds a SQLite connection waits for the lock of another writer
+SQLITE_TIMEOUT = 60
+
+
+def _options(url, bulk: bool) -> dict:
+
+    options = {'insertmanyvalues_page_size': INSERT_PAGE_SIZE}
+
+    if url.get_backend_name() == 'postgresql':
+        settings = {'work_mem': WORK_MEM}
+        if bulk:
+            settings['synchronous_commit'] = 'off'
+        connect_args = {'options': ' '.join(f'-c {k}={v}' for k, v in settings.items())}
+
+        if url.get_driver_name() == 'psycopg':
+            connect_args['prepare_threshold'] = PREPARE_THRESHOLD
+        elif url.get_driver_name() == 'psycopg2':
+            options['executemany_mode'] = 'values_plus_batch'
+            options['executemany_batch_page_size'] = BATCH_PAGE_SIZE
+
+        options.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_pre_ping=True,
+                       connect_args=connect_args)
+
+    elif url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {'timeout': SQLITE_TIMEOUT}
+
+    return options
+
+
+def create_engine(url: str = None, bulk: bool = False, **kwargs):
+    """
+    Engine for url, URL when not given. With bulk a commit does not wait
+    for the write-ahead log, or for the SQLite file, to reach the disk.
+    A crash can lose the last transactions then, which a build loads
+    again anyway.
+    """
+
+    url = sqlalchemy.make_url(url or URL)
+    options = _options(url, bulk)
+    options.update(kwargs)
+    engine = sqlalchemy.create_engine(url, **options)
+
+    if bulk and url.get_backend_name() == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def _no_sync(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA synchronous = OFF')
+            cursor.close()
+
+    return engine
+
+
+def create_async_engine(url: str = None, **kwargs):
+    """
+    asyncio engine for url, URL when not given, on the psycopg 3 driver.
+    None for databases other than PostgreSQL.
+    """
+
+    url = sqlalchemy.make_url(url or URL)
+    if url.get_backend_name() != 'postgresql':
+        return None
+
+    # Needs greenlet, which the loaders do without
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = url.set(drivername='postgresql+psycopg')
+    options = _options(url, False)
+    options.update(kwargs)
+    return create_async_engine(url, **options)
+
+
+class DataVersion:
+    """
+    Digest of the build manifest of engine, it changes with every loaded
+    table. Caches keyed by it forget their answers after a build. Calls
+    within seconds of the last read return the same digest.
+    """
+
+    def __init__(self, engine, seconds: float = VERSION_SECONDS):
+        self.engine = engine
+        self.seconds = seconds
+        self.version = None
+        self.read = 0.0
+        self.lock = threading.Lock()
+
+    def _cached(self) -> str:
+        with self.lock:
+            if self.version is not None and time.monotonic() - self.read < self.seconds:
+                return self.version
+        return None
+
+    def __call__(self) -> str:
+
+        version = self._cached()
+        if version is not None:
+            return version
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(text('SELECT loader, digest FROM build_manifest ORDER BY loader')).all()
+        version = hashlib.sha256(repr([tuple(r) for r in rows]).encode('utf-8')).hexdigest()[:16]
+
+        with self.lock:
+            self.version = version
+            self.read = time.monotonic()
+        return version
+
+    async def get(self) -> str:
+        """ The digest on the event loop, the manifest is read in a worker thread """
+
+        version = self._cached()
+        if version is not None:
+            return version
+        return await asyncio.to_thread(self)
@@ -5,15 +5,20 @@ import glob
 from os import path
 import sys
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
+from database import create_engine
 from models import District
+import metrics
 
 # https://www.nsi.bg/nrnm/ekatte/archive
 
 DATA_DIR = 'data/nsi.bg'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [f'{DATA_DIR}/*/ek_obl.json']
+TABLES = [District]
+
 """
   name      Char 25  - Наименование на областта
   abbrev    Char 3   - Идентификационен код на областта (3 букви).
@@ -27,7 +32,8 @@ def _process_one_year(dir: str, unique_filter: set) -> list:
 
     file_path = path.join(dir, 'ek_obl.json')
     with open(file_path, 'r', encoding='utf-8') as file:
-        a_json = json.load(file)
+        with metrics.phase('parse'):
+            a_json = json.load(file)
 
     if not a_json:
         return table_rows
@@ -54,14 +60,20 @@ def _load(dir_name):
 
     return rows
 
-if __name__ == "__main__":
+
+def load(session: Session) -> int:
+
     rows = _load(DATA_DIR)
-    if not rows:
-        sys.exit(0)
+    session.add_all(rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    engine = create_engine(bulk=True)
 
-    engine = create_engine("postgresql://localhost/infobg")
     with Session(engine) as session:
-        session.add_all(rows)
+        if not load(session):
+            sys.exit(0)
         session.commit()
 
         row = session.query(District).filter_by(abbrev='SHU').first()
@@ -1,104 +1,84 @@
 #!/usr/bin/env python3
 
 from os import path
-import csv
 import sys
 from datetime import date
 
-from sqlalchemy import create_engine
+import numpy as np
 from sqlalchemy.orm import Session
 
-from models import Municipality, Moment, Education
+from database import create_engine
+from models import Municipality, Education
+from lookup import Lookup
+from bulk import copy_rows
+from infostat import read_table
+import metrics
 
 
 DATA_DIR = 'data/infostat.nsi.bg'
 
 IN_FILE = 'ОБРАЗОВАНИЕ 7+.csv'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [path.join(DATA_DIR, IN_FILE)]
+TABLES = [Education]
+
 
 def _load(session: Session):
 
     rows = list()
+    lookup = Lookup(session)
 
-    file_path = path.join(DATA_DIR, IN_FILE)
-    with open(file_path, newline='') as csv_file:
-        spam = csv.reader(csv_file, delimiter=';')
-
-        next(spam)
-        tokens = next(spam)
-        next(spam)
+    table = read_table(path.join(DATA_DIR, IN_FILE))
 
-        date_indexes = []
-        for t in tokens:
-            if t:
-                c_date = date(int(t), 1, 1)
-                d_index = Moment.insert_date(c_date, session)
-            else:
-                d_index = None
+    years = table.years()
+    lookup.insert_moments(date(year, 1, 1) for year in years if year)
 
-            date_indexes.append(d_index)
+    date_indexes = [lookup.moment(date(year, 1, 1)) if year else None for year in years]
 
-        for row in spam:
-            m_name = row[0].lower().capitalize()
+    # Empty cells count as 0, rows without a total are skipped
+    missing = np.isnan(table.values)
+    counts = np.nan_to_num(table.values).astype(int)
 
-            municipality = session.query(Municipality).filter_by(name=m_name).first()
-            if not municipality:
-                print(f'Не намирам община {m_name}')
-                continue
+    for (label, *_), numbers, empty in zip(table.labels, counts, missing):
+        m_name = label.lower().capitalize()
 
-            for offs in [1, 7]:
+        m_index = lookup.municipality_by_name(m_name)
+        if m_index is None:
+            print(f'Не намирам община {m_name}')
+            metrics.rejected()
+            continue
 
-                d_index = date_indexes[offs]
+        for offs in [0, 6]:
 
-                try:
-                    total = int(row[offs + 0])
-                except ValueError:
-                    continue
+            d_index = date_indexes[offs]
 
-                try:
-                    university = int(row[offs + 1])
-                except ValueError:
-                    university = 0
+            if empty[offs]:
+                continue
 
-                try:
-                    secondary = int(row[offs + 2])
-                except ValueError:
-                    secondary = 0
+            (total, university, secondary, primary, elementary, none) = numbers[offs:offs + 6]
 
-                try:
-                    primary = int(row[offs + 3])
-                except ValueError:
-                    primary = 0
+            new_node = Education.values(m_index, d_index, total,
+                                        university, secondary, primary,
+                                        elementary, none)
+            rows.append(new_node)
 
-                try:
-                    elementary = int(row[offs + 4])
-                except ValueError:
-                    elementary = 0
+    return rows
 
-                try:
-                    none = int(row[offs + 5])
-                except ValueError:
-                    none = 0
 
-                new_node = Education(municipality.id, d_index, total,
-                                     university, secondary, primary,
-                                     elementary, none)
-                rows.append(new_node)
+def load(session: Session) -> int:
 
-    return rows
+    return copy_rows(session, Education, _load(session))
 
 
 if __name__ == "__main__":
 
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
 
-        rows = _load(session)
-        if not rows:
+        if not load(session):
             sys.exit(0)
-
-        session.add_all(rows)
         session.commit()
 
         rows = session.query(Education).all()
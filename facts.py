@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# Flat copies of the fact tables for analytics, see SchoolFact and
+# SettlementYearFact
+
+import sys
+
+from sqlalchemy import select, insert, update, func, extract
+from sqlalchemy.orm import Session, aliased
+
+from database import create_engine
+from models import District, Municipality, Settlement, Institution
+from models import Examination, ExaminationSubject, Census, Moment
+from models import SchoolFact, SettlementYearFact
+
+
+# Input files and the tables filled from them, see infobg.py
+SOURCES = []
+TABLES = [SchoolFact, SettlementYearFact]
+
+
+def _load_settlements(session: Session) -> int:
+
+    # Repeated census rows of one settlement and date are summed
+    years = select(Census.settlement_id, Moment.date,
+                   func.sum(Census.permanent).label('permanent'),
+                   func.sum(Census.current).label('current')) \
+        .join(Moment, Moment.id == Census.date_id) \
+        .group_by(Census.settlement_id, Moment.date) \
+        .subquery('years')
+
+    query = select(Settlement.id, Settlement.name,
+                   Municipality.id, Municipality.abbrev, Municipality.name,
+                   District.id, District.abbrev, District.name,
+                   years.c.date, extract('year', years.c.date),
+                   years.c.permanent, years.c.current) \
+        .select_from(years) \
+        .join(Settlement, Settlement.id == years.c.settlement_id) \
+        .join(Municipality, Municipality.id == Settlement.municipality_id) \
+        .join(District, District.id == Municipality.district_id)
+
+    columns = ['settlement_id', 'settlement',
+               'municipality_id', 'municipality_code', 'municipality',
+               'district_id', 'district_code', 'district',
+               'date', 'year', 'permanent', 'current']
+
+    session.execute(insert(SettlementYearFact).from_select(columns, query))
+
+    # The last year of each settlement, found through the unique
+    # (settlement_id, date) index
+    last = aliased(SettlementYearFact)
+
+    def _newest(column):
+        return select(column) \
+            .where(last.settlement_id == SettlementYearFact.settlement_id) \
+            .order_by(last.date.desc()).limit(1).scalar_subquery()
+
+    session.execute(update(SettlementYearFact).values(population=_newest(last.permanent),
+                                                      population_year=_newest(last.year)))
+
+    return session.scalar(select(func.count()).select_from(SettlementYearFact))
+
+
+def _load_schools(session: Session) -> int:
+
+    latest = select(SettlementYearFact.settlement_id,
+                    func.max(SettlementYearFact.population).label('population'),
+                    func.max(SettlementYearFact.population_year).label('population_year')) \
+        .group_by(SettlementYearFact.settlement_id) \
+        .subquery('latest')
+
+    query = select(Institution.id, Institution.code, Institution.name,
+                   Settlement.id, Settlement.name,
+                   Municipality.id, Municipality.name,
+                   District.id, District.name,
+                   Moment.date, extract('year', Moment.date),
+                   ExaminationSubject.subject, Examination.grade,
+                   Examination.score, Examination.students,
+                   latest.c.population, latest.c.population_year) \
+        .select_from(Examination) \
+        .join(Institution, Institution.id == Examination.institution_id) \
+        .join(Settlement, Settlement.id == Institution.settlement_id) \
+        .join(Municipality, Municipality.id == Settlement.municipality_id) \
+        .join(District, District.id == Municipality.district_id) \
+        .join(Moment, Moment.id == Examination.date_id) \
+        .join(ExaminationSubject, ExaminationSubject.id == Examination.subject_id) \
+        .outerjoin(latest, latest.c.settlement_id == Settlement.id)
+
+    columns = ['institution_id', 'institution_code', 'institution',
+               'settlement_id', 'settlement',
+               'municipality_id', 'municipality', 'district_id', 'district',
+               'date', 'year', 'subject', 'grade', 'score', 'students',
+               'population', 'population_year']
+
+    session.execute(insert(SchoolFact).from_select(columns, query))
+    return session.scalar(select(func.count()).select_from(SchoolFact))
+
+
+def load(session: Session) -> int:
+    """ Fill the tables with INSERT ... SELECT, the rows never leave the database """
+
+    return _load_settlements(session) + _load_schools(session)
+
+
+if __name__ == "__main__":
+
+    engine = create_engine(bulk=True)
+
+    with Session(engine) as session:
+
+        if not load(session):
+            sys.exit(0)
+        session.commit()
+
+        rows = session.query(SchoolFact).filter_by(subject='Математика', year=2024) \
+            .order_by(SchoolFact.score.desc()).limit(5).all()
+        for r in rows:
+            print(r)
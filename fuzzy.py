@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# Approximate matching of place names
+
+
+def distance(a: str, b: str) -> int:
+    """ Levenshtein distance between a and b """
+
+    if len(a) < len(b):
+        a, b = b, a
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        previous = current
+
+    return previous[-1]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of words. Every child of a node is keyed by its
+    distance to the node, so a query for words within n edits only visits
+    the children with keys within n of the distance to the query.
+    """
+
+    def __init__(self, words=()):
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+
+        if self.root is None:
+            self.root = (word, {})
+            return
+
+        node = self.root
+        while True:
+            d = distance(word, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, n: int) -> list:
+        """ (distance, word) of all words within n edits of word, closest first """
+
+        result = []
+        nodes = [self.root] if self.root else []
+        while nodes:
+            node = nodes.pop()
+            d = distance(word, node[0])
+            if d <= n:
+                result.append((d, node[0]))
+            nodes.extend(child for k, child in node[1].items() if d - n <= k <= d + n)
+
+        return sorted(result)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+# grao.bg
+
+import mmap
+import re
+
+import numpy as np
+
+import cache
+import metrics
+
+ENCODING = 'windows-1251'
+
+# Record kinds
+HEADER = 0
+ROW = 1
+
+
+def _nocase(text: str) -> bytes:
+    """ Case insensitive byte pattern for text encoded in ENCODING """
+
+    pattern = b''
+    for ch in text:
+        if ch.lower() == ch.upper():
+            pattern += re.escape(ch.encode(ENCODING))
+        else:
+            pattern += b'[' + re.escape(ch.upper().encode(ENCODING)) + \
+                re.escape(ch.lower().encode(ENCODING)) + b']'
+    return pattern
+
+
+# '|гр', '|с', '| гр', '| с', '! гр' or '! с' after leading white space
+ROW_START = re.compile(rb'\s*(\| ?|! )(?:' + _nocase('гр') + b'|' + _nocase('с') + b')')
+
+# The only table line which is not a settlement but still matters
+TOTAL = re.compile(_nocase('всичко за общината'))
+
+
+def _decode(raw: bytes) -> str:
+
+    line = raw.decode(ENCODING)
+    if 'ЬО' not in line:
+        line = line.replace('Ь', 'Ъ')
+
+    return line.lower().strip()
+
+
+def _lines(file_name: str):
+
+    with open(file_name, 'rb') as txt_file:
+        try:
+            data = mmap.mmap(txt_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return
+
+        with data:
+            start = 0
+            end = len(data)
+            while start < end:
+                stop = data.find(b'\n', start)
+                if stop < 0:
+                    stop = end
+                yield data[start:stop]
+                start = stop + 1
+
+
+def tadr_records(file_name: str):
+    """
+    Walk a GRAO tadr-*.txt table without loading it into memory.
+
+    Yields (HEADER, num, text) for the lines outside of the tables, which
+    carry the date, district and municipality, and for the municipality
+    total line. Settlement lines are yielded as (ROW, num, name, numbers)
+    where name is the first column and numbers a tuple with the remaining
+    columns. Text is lower case, stripped and with 'Ь' replaced by 'Ъ'.
+    Ruler and column header lines are never decoded. Rows with a cell
+    which is not a number are reported with their byte offset and skipped.
+    """
+
+    num = start = stop = 0
+    try:
+        for num, raw in enumerate(_lines(file_name)):
+            start, stop = stop, stop + len(raw) + 1
+
+            match = ROW_START.match(raw)
+            if match:
+                sep = '!' if match.group(1) == b'! ' else '|'
+                tokens = _decode(raw)[1:-1].split(sep)
+                try:
+                    numbers = tuple(int(t) for t in tokens[1:])
+                except ValueError as err:
+                    print(f'{file_name}:{num}:{start}:{err}')
+                    continue
+                yield ROW, num, tokens[0].strip(), numbers
+                continue
+
+            head = raw.lstrip()
+            if not head:
+                continue
+
+            if head[:1] in b'|!-':
+                if TOTAL.search(head):
+                    yield HEADER, num, _decode(raw)
+                continue
+
+            yield HEADER, num, _decode(raw)
+
+    except UnicodeDecodeError as err:
+        print(f'{file_name}:{num}:{start}:{err}')
+
+
+def _layout(raw: bytes) -> list | None:
+    """ (start, stop) of every cell of a table row with numbers, else None """
+
+    bars = [i for i, ch in enumerate(raw) if ch == ord('|')]
+    cells = list(zip(bars[:-1], bars[1:]))
+    if len(cells) < 2 or not raw[cells[-1][0] + 1:cells[-1][1]].strip().isdigit():
+        return None
+
+    return [(start + 1, stop) for start, stop in cells]
+
+
+def t41_records(file_name: str):
+    """
+    Walk a GRAO t41ob-*.txt or t41nm-*.txt report. All tables in one file
+    share the same fixed width layout, so the cell positions are taken
+    once from the first row with numbers and every later row is only
+    sliced at them.
+
+    Yields (HEADER, num, text) for the lines outside of the tables and
+    (ROW, num, name, numbers) for the table rows, where numbers holds
+    the remaining cells, None for the empty ones. Lines which do not
+    decode or have a cell which is not a number are reported and skipped.
+    """
+
+    layout = None
+    width = 0
+    for num, raw in enumerate(_lines(file_name)):
+
+        raw = raw.rstrip()
+        try:
+            if not raw.startswith(b'|'):
+                head = raw.lstrip()
+                record = None
+                if head and not head.startswith(b'-'):
+                    record = HEADER, num, _decode(raw)
+
+            else:
+                if layout is None:
+                    layout = _layout(raw)
+                    if layout is None:
+                        continue
+                    width = len(raw)
+
+                # Column headings have other widths or text instead of numbers
+                (start, stop), *cells = layout
+                if len(raw) != width or not raw[cells[0][0]:cells[0][1]].strip().isdigit():
+                    continue
+
+                numbers = tuple(int(raw[a:b]) if raw[a:b].strip() else None for a, b in cells)
+                record = ROW, num, _decode(raw[start:stop]), numbers
+
+        except (UnicodeDecodeError, ValueError) as err:
+            # Only this line is lost, not the rest of the file
+            print(f'{file_name}:{num}:{err}')
+            metrics.rejected()
+            continue
+
+        if record is not None:
+            yield record
+
+
+def _columns(records) -> dict:
+
+    kinds = []
+    nums = []
+    texts = []
+    numbers = []
+    for record in records:
+        kinds.append(record[0])
+        nums.append(record[1])
+        texts.append(record[2])
+        numbers.append(record[3] if record[0] == ROW else ())
+
+    # None and the missing cells of short rows as -1
+    width = max((len(n) for n in numbers), default=0)
+    cells = np.full((len(numbers), width), -1, dtype=np.int32)
+    for i, row in enumerate(numbers):
+        cells[i, :len(row)] = [-1 if n is None else n for n in row]
+
+    return {'kind': np.array(kinds, dtype=np.int8),
+            'num': np.array(nums, dtype=np.int64),
+            'count': np.array([len(n) for n in numbers], dtype=np.int64),
+            'text': texts,
+            'numbers': cells}
+
+
+def records(walk, file_name: str):
+    """
+    Same records as walk(file_name), where walk is tadr_records or
+    t41_records, but parsed only once per version of the file and read
+    back from the cache afterwards.
+    """
+
+    columns = cache.columns(file_name, lambda f: _columns(walk(f)), __file__)
+
+    for kind, num, text, count, numbers in zip(columns['kind'].tolist(), columns['num'].tolist(),
+                                               columns['text'], columns['count'].tolist(),
+                                               columns['numbers'].tolist()):
+        if kind == ROW:
+            yield ROW, num, text, tuple(None if n < 0 else n for n in numbers[:count])
+        else:
+            yield HEADER, num, text
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+
+import argparse
+import ast
+import glob
+import hashlib
+import importlib
+import os
+import sys
+import time
+from os import path
+from inspect import signature
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from sqlalchemy import inspect, select, insert, delete, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from sqlalchemy_utils import database_exists
+
+from database import create_engine, URL
+from models import Base, Manifest, recreate
+from bulk import BATCH_ROWS
+import metrics
+import views
+
+
+# Loader module -> loaders which have to be committed before it starts.
+# Listed in dependency order.
+STAGES = {
+    'districts': [],
+    'municipalities': ['districts'],
+    'locations': ['municipalities'],
+    'aliases': [],
+
+    'details': [],
+    'finance': [],
+    'transform': [],
+    'institutions': ['locations', 'aliases', 'details', 'finance', 'transform'],
+
+    'subjects': [],
+    'scores': ['institutions', 'subjects'],
+
+    'religion': ['municipalities'],
+    'language': ['municipalities'],
+    'ethnicity': ['municipalities'],
+    'census': ['locations', 'aliases'],
+    'population': ['locations', 'aliases'],
+    'education7+': ['municipalities'],
+    'literacy': ['municipalities'],
+    'statistic': ['locations'],
+
+    'facts': ['scores', 'census'],
+}
+
+# PostgreSQL aborts one of two loaders which deadlock, it is then run
+# again. The moments, which all of them share, are committed apart from
+# the facts, so that they do not lock each other out on them.
+DEADLOCK_RETRIES = 3
+
+
+def _is_deadlock(err: DBAPIError) -> bool:
+
+    code = getattr(err.orig, 'pgcode', None) or getattr(err.orig, 'sqlstate', None)
+    return code == '40P01'
+
+
+def _sources(module) -> list:
+
+    file_names = []
+    for pattern in module.SOURCES:
+        file_names.extend(sorted(glob.glob(pattern)))
+
+    return file_names
+
+
+def _scripts(file_name: str, found: dict = None) -> list:
+    """ file_name and the scripts of this directory it imports, directly or through another one """
+
+    found = {} if found is None else found
+    found[file_name] = True
+
+    with open(file_name, 'rb') as file:
+        tree = ast.parse(file.read(), file_name)
+
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+
+    for name in names:
+        script = path.join(path.dirname(file_name), f'{name}.py')
+        if script not in found and path.exists(script):
+            _scripts(script, found)
+
+    return list(found)
+
+
+def digest(name: str) -> str:
+    """
+    SHA-256 over the loader script, the scripts it imports, like grao.py
+    or lookup.py, and all of its SOURCES
+    """
+
+    module = importlib.import_module(name)
+    scripts = _scripts(module.__file__)
+
+    h = hashlib.sha256()
+    for file_name in scripts[:1] + sorted(scripts[1:]) + _sources(module):
+        h.update(path.basename(file_name).encode('utf-8') + b'\0')
+        with open(file_name, 'rb') as file:
+            while chunk := file.read(1 << 20):
+                h.update(chunk)
+
+    return h.hexdigest()
+
+
+def downstream(names: set) -> set:
+    """ names and every loader which depends on one of them """
+
+    result = set(names)
+    for name, deps in STAGES.items():
+        if any(d in result for d in deps):
+            result.add(name)
+
+    return result
+
+
+def _jobs(engine, jobs: int) -> int:
+
+    # SQLite has a single writer, concurrent loaders would only wait for
+    # its lock and time out
+    return 1 if engine.dialect.name == 'sqlite' else jobs
+
+
+def _load(module, session: Session, jobs: int) -> int:
+
+    # Loaders with worker processes of their own, like census, stay within -j
+    if 'jobs' in signature(module.load).parameters:
+        return module.load(session, jobs=jobs)
+    return module.load(session)
+
+
+def _run_stage(engine, report: metrics.Report, name: str, jobs: int) -> tuple:
+
+    module = importlib.import_module(name)
+    h = digest(name)
+
+    with report.stage(name) as stage:
+        stage.input_bytes = sum(path.getsize(f) for f in _sources(module))
+        for attempt in range(DEADLOCK_RETRIES + 1):
+            try:
+                with Session(engine) as session:
+                    rows = _load(module, session, jobs)
+                    session.merge(Manifest(loader=name, digest=h))
+                    with metrics.phase('write'):
+                        session.commit()
+                break
+            except DBAPIError as err:
+                if not _is_deadlock(err) or attempt == DEADLOCK_RETRIES:
+                    raise
+                print(f'{name}: взаимно блокиране, нов опит')
+        stage.rows = rows
+
+    return rows, stage.seconds
+
+
+def _analyze(engine) -> None:
+    """ Statistics for the planner, which has none for freshly loaded tables """
+
+    if engine.dialect.name in ('postgresql', 'sqlite'):
+        with engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+
+
+def _refresh(engine, report: metrics.Report) -> None:
+
+    with report.stage('views') as stage:
+        views.refresh(engine)
+    print(f'{"views":16} {stage.seconds:8.2f}s')
+
+
+def _finish(engine, report: metrics.Report, start: float) -> None:
+
+    with report.stage('analyze'):
+        _analyze(engine)
+    print(f'{"общо":16} {time.perf_counter() - start:8.2f}s')
+    print(f'{"отчет":16} {report.write()}')
+
+
+def build(engine, jobs: int, partitioned: bool = False) -> bool:
+    """
+    Run every loader in STAGES once all of its dependencies are done.
+    Independent loaders share the connection pool of engine and run
+    concurrently on up to jobs threads, on SQLite one at a time. Loaders which depend on a failed
+    one are skipped. partitioned creates the models.PARTITIONED tables
+    with one partition per date. The numbers of every loader go into a
+    metrics report.
+    """
+
+    start = time.perf_counter()
+    jobs = _jobs(engine, jobs)
+    report = metrics.Report('build', engine)
+    with report.stage('models') as stage:
+        recreate(engine, partitioned)
+        views.create(engine)
+    print(f'{"models":16} {stage.seconds:8.2f}s')
+
+    done = set()
+    failed = set()
+    pending = dict(STAGES)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+
+            for name, deps in list(pending.items()):
+                if any(d in failed for d in deps):
+                    print(f'{name:16} пропуснат')
+                    failed.add(name)
+                    del pending[name]
+                elif all(d in done for d in deps):
+                    running[pool.submit(_run_stage, engine, report, name, jobs)] = name
+                    del pending[name]
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    rows, elapsed = future.result()
+                except Exception as err:
+                    print(f'{name:16} грешка: {err}')
+                    failed.add(name)
+                    continue
+
+                print(f'{name:16} {elapsed:8.2f}s {rows:10} реда')
+                done.add(name)
+
+    if not failed:
+        _refresh(engine, report)
+
+    _finish(engine, report, start)
+
+    return not failed
+
+
+def update(engine, jobs: int) -> bool:
+    """
+    Run again only the loaders whose script or input files changed since
+    they were last loaded, together with everything downstream of them.
+    Their old rows are deleted and the new ones written in a single
+    transaction, so a failed update leaves the database as it was.
+    """
+
+    start = time.perf_counter()
+    jobs = _jobs(engine, jobs)
+
+    Base.metadata.create_all(engine)
+    # create_all() adds no indexes to tables which already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    views.create(engine)
+
+    with Session(engine) as session:
+        known = dict(session.execute(select(Manifest.loader, Manifest.digest)).all())
+
+    digests = {name: digest(name) for name in STAGES}
+    changed = {name for name, h in digests.items() if known.get(name) != h}
+    # STAGES is in dependency order
+    names = [name for name in STAGES if name in downstream(changed)]
+
+    if not names:
+        views.refresh(engine, empty_only=True)
+        print('няма промени')
+        return True
+
+    report = metrics.Report('update', engine)
+    with Session(engine) as session:
+
+        tables = [model.__table__ for name in reversed(names)
+                  for model in reversed(importlib.import_module(name).TABLES)]
+        if engine.dialect.name == 'postgresql':
+            # All referencing tables are in the list too. Unlike DELETE it
+            # does not check the foreign keys row by row and restarts the
+            # ids, so they come out the same as after a full build.
+            preparer = engine.dialect.identifier_preparer
+            names_sql = ', '.join(preparer.format_table(t) for t in tables)
+            session.execute(text(f'TRUNCATE {names_sql} RESTART IDENTITY'))
+        else:
+            for table in tables:
+                session.execute(delete(table))
+
+        for name in names:
+            module = importlib.import_module(name)
+            try:
+                with report.stage(name) as stage:
+                    stage.input_bytes = sum(path.getsize(f) for f in _sources(module))
+                    stage.rows = _load(module, session, jobs)
+                    session.merge(Manifest(loader=name, digest=digests[name]))
+                    with metrics.phase('write'):
+                        session.flush()
+            except Exception as err:
+                print(f'{name:16} грешка: {err}')
+                session.rollback()
+                print(f'{"отчет":16} {report.write()}')
+                return False
+
+            print(f'{name:16} {stage.seconds:8.2f}s {stage.rows:10} реда')
+
+        with report.stage('commit'):
+            session.commit()
+
+    _refresh(engine, report)
+    _finish(engine, report, start)
+
+    return True
+
+
+def snapshot(engine, file_name: str) -> None:
+    """
+    Copy all tables of the database of engine, with their indexes, into
+    a new SQLite file. The views become plain tables.
+    """
+
+    start = time.perf_counter()
+
+    # Written aside and renamed, so a failed copy leaves no half file
+    tmp_name = f'{file_name}.tmp'
+    if path.exists(tmp_name):
+        os.remove(tmp_name)
+
+    target = create_engine(f'sqlite:///{tmp_name}', bulk=True)
+    Base.metadata.create_all(target)
+
+    with engine.connect() as source, target.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            table_start = time.perf_counter()
+            rows = 0
+            result = source.execution_options(yield_per=BATCH_ROWS).execute(select(table))
+            for batch in result.partitions():
+                conn.execute(insert(table), [row._asdict() for row in batch])
+                rows += len(batch)
+            print(f'{table.name:16} {time.perf_counter() - table_start:8.2f}s {rows:10} реда')
+
+    views.refresh(target)
+    _analyze(target)
+    target.dispose()
+
+    os.replace(tmp_name, file_name)
+    print(f'{"общо":16} {time.perf_counter() - start:8.2f}s')
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog='infobg')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cmd = commands.add_parser('build', help='зарежда таблиците, които са остарели спрямо входните файлове')
+    cmd.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                     help='брой едновременно работещи зареждания')
+    cmd.add_argument('--full', action='store_true',
+                     help='пресъздава базата данни дори когато входните файлове не са променени')
+    cmd.add_argument('--partition', action='store_true',
+                     help='при пресъздаване разделя преброяванията и изпитите на части по дата')
+    cmd.add_argument('--url', default=URL)
+
+    cmd = commands.add_parser('snapshot', help='копира базата данни в един SQLite файл')
+    cmd.add_argument('file', help='име на SQLite файла')
+    cmd.add_argument('--url', default=URL)
+
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        snapshot(create_engine(args.url), args.file)
+
+    if args.command == 'build':
+        engine = create_engine(args.url, bulk=True, pool_size=args.jobs)
+        if args.full or not database_exists(engine.url) or \
+                not inspect(engine).has_table(Manifest.__tablename__):
+            ok = build(engine, args.jobs, args.partition)
+        else:
+            ok = update(engine, args.jobs)
+        if not ok:
+            sys.exit(1)
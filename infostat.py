@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# infostat.nsi.bg
+
+import re
+
+import numpy as np
+
+import metrics
+
+
+# Cells without a number: empty, '..' not available, '.' confidential,
+# '-' no case
+NULLS = ['', '.', '..', '-']
+
+YEAR = re.compile(r'\d{4}')
+
+
+class Table:
+    """
+    One infostat.nsi.bg CSV export.
+
+    The first rows are stacked column headings (unit, year, sex, category
+    and so on), recognised by their empty first cell. The first columns
+    of the remaining rows are labels: the territory, followed in some
+    exports by an indicator and its unit.
+
+    labels  - one tuple with the label cells per row
+    headers - one tuple with the heading cells per value column
+    values  - float64 array of rows x value columns, NaN for empty cells
+    """
+
+    def __init__(self, labels: list, headers: list, values: np.ndarray):
+        self.labels = labels
+        self.headers = headers
+        self.values = values
+
+    def years(self) -> list:
+        """ Year of every value column, None when the table has no year heading """
+
+        for level in range(len(self.headers[0]) if self.headers else 0):
+            cells = [h[level] for h in self.headers]
+            if all(YEAR.fullmatch(c) for c in cells):
+                return [int(c) for c in cells]
+
+        return [None] * len(self.headers)
+
+    def categories(self) -> list:
+        """ Headings of every value column except the year, joined with ' / ' """
+
+        years = self.years()
+        result = []
+        for year, heading in zip(years, self.headers):
+            parts = [h for h in heading if h and h != str(year)]
+            result.append(' / '.join(parts))
+
+        return result
+
+    def melt(self) -> tuple:
+        """ Row indexes, column indexes and values of all non empty cells """
+
+        rows, cols = np.nonzero(~np.isnan(self.values))
+        return rows, cols, self.values[rows, cols]
+
+
+@metrics.phase('parse')
+def read_table(file_name: str) -> Table:
+
+    with open(file_name, encoding='utf-8-sig', newline='') as file:
+        lines = [line.rstrip('\r\n').removesuffix(';').split(';') for line in file]
+
+    lines = [line for line in lines if any(line)]
+
+    n_labels = 0
+    while n_labels < len(lines[0]) and not lines[0][n_labels]:
+        n_labels += 1
+
+    n_headers = 0
+    while n_headers < len(lines) and not lines[n_headers][0]:
+        n_headers += 1
+
+    headers = list(zip(*(line[n_labels:] for line in lines[:n_headers])))
+    labels = [tuple(line[:n_labels]) for line in lines[n_headers:]]
+
+    cells = np.array([line[n_labels:] for line in lines[n_headers:]], dtype=str)
+
+    # '(2.6)' is a provisional value and '12 111' has a thousands separator
+    cells = np.char.replace(np.char.strip(cells, ' ()'), '\xa0', '')
+    cells[np.isin(cells, NULLS)] = 'nan'
+
+    return Table(labels, headers, cells.astype(np.float64))
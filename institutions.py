@@ -4,20 +4,17 @@ import json
 import sys
 from os import path
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from models import InstitutionStatus
-from models import InstitutionDetails
-from models import InstitutionFinancing
+from database import create_engine
 from models import Institution
-from models import Settlement
-from models import Municipality
-from models import District
+from lookup import Lookup
+from aliases import Aliases
 
 from finance import guess_institution_financing
 from details import guess_institution_details
 from transform import guess_institution_status
+import metrics
 
 MON_DIR = 'data/mon.bg'
 REGISTER = 'public-register.json'
@@ -27,17 +24,23 @@ INTERNAL = 'matura_results.json'
 EXTERNAL = 'results.json'
 SCHOOLS = 'matura_schools.json'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [path.join(MON_DIR, REGISTER), path.join(RES_DIR, INTERNAL),
+           path.join(RES_DIR, EXTERNAL), path.join(RES_DIR, SCHOOLS)]
+TABLES = [Institution]
+
 # https://nvoresults.com/matura_schools.json
 
 
-def _load_mon(unique_set: set, session: Session) -> list:
+def _load_mon(unique_set: set, lookup: Lookup) -> list:
 
     rows = list()
 
     file_path = path.join(MON_DIR, REGISTER)
     with open(file_path, 'r', encoding='UTF-8') as file:
         try:
-            register = json.load(file)['data']['publicInstitutions']
+            with metrics.phase('parse'):
+                register = json.load(file)['data']['publicInstitutions']
         except KeyError as err:
             print(f'{err}')
             sys.exit(1)
@@ -49,6 +52,7 @@ def _load_mon(unique_set: set, session: Session) -> list:
 
         if school_code != num_id:
             print(f'Разминаване в кода на институцията {school_code} != {num_id}')
+            metrics.rejected()
             continue
 
         if school_code in unique_set:
@@ -56,30 +60,30 @@ def _load_mon(unique_set: set, session: Session) -> list:
 
         name = node['name']
         s_code = str(node['town']).zfill(5)
-        s_index = session.query(Settlement.id).filter_by(id=s_code).first()
-        if not s_index:
+        if int(s_code) not in lookup.settlement_ids:
             print(f'Невалидно селище {s_code}: {name}')
+            metrics.rejected()
             continue
 
         f_code = int(node['financialSchoolType'])
-        f_index = session.query(InstitutionFinancing.id).filter_by(id=f_code).first()
-        if not f_index:
+        if f_code not in lookup.financing_ids:
             print(f'Невалиден финасов код {f_code}: {name}')
+            metrics.rejected()
             continue
 
         d_code = int(node['detailedSchoolType'])
-        d_index = session.query(InstitutionDetails.id).filter_by(id=d_code).first()
-        if not d_index:
+        if d_code not in lookup.details_ids:
             print(f'Невалиден детайлен код {d_code}: {name}')
+            metrics.rejected()
             continue
 
         t_code = int(node['transformType'])
-        t_index = session.query(InstitutionStatus.id).filter_by(id=t_code).first()
-        if not t_index:
+        if t_code not in lookup.status_ids:
             print(f'Невалиден код на състоянието {t_code}: {name}')
+            metrics.rejected()
             continue
 
-        new_unit = Institution(code=school_code, name=name, settlement_id=s_index[0],
+        new_unit = Institution(code=school_code, name=name, settlement_id=int(s_code),
                                financing_id=f_code, details_id=d_code,
                                status_id=t_code)
 
@@ -89,28 +93,23 @@ def _load_mon(unique_set: set, session: Session) -> list:
     return rows
 
 
-def _strip_location(location: str) -> str:
+def _strip_location(location: str, aliases: Aliases) -> str:
 
     location = location.lower()
     location = location.removeprefix('гр.')
     location = location.removeprefix('с.').strip()
 
-    cap = location.capitalize()
-    if 'София-област' == cap:
-        cap = 'София'
-    elif 'София-град' == cap:
-        cap = 'София (столица)'
-
-    return cap
+    return aliases.name(location)
 
 
-def _load_nvo(unique_set: set, session: Session) -> list:
+def _load_nvo(unique_set: set, lookup: Lookup, aliases: Aliases) -> list:
 
     rows = list()
 
     file_name = path.join(RES_DIR, SCHOOLS)
     with open(file_name, 'r', encoding='utf-8') as file:
-        datum = json.load(file)
+        with metrics.phase('parse'):
+            datum = json.load(file)
 
         for school_code in datum:
 
@@ -118,30 +117,33 @@ def _load_nvo(unique_set: set, session: Session) -> list:
                 continue
 
             school_name = datum[school_code]['data']['school']
-            s_name = _strip_location(datum[school_code]['data']['city'])
-            m_name = _strip_location(datum[school_code]['data']['obshtina'])
-            d_name = _strip_location(datum[school_code]['data']['oblast'])
+            s_name = _strip_location(datum[school_code]['data']['city'], aliases)
+            m_name = _strip_location(datum[school_code]['data']['obshtina'], aliases)
+            d_name = _strip_location(datum[school_code]['data']['oblast'], aliases)
 
-            d_index = session.query(District.id).filter_by(name=d_name).first()
-            if not d_index:
+            d_index = lookup.district(d_name)
+            if d_index is None:
                 print(f'Невалидна област: {d_name}')
+                metrics.rejected()
                 continue
 
-            m_index = session.query(Municipality.id).filter_by(name=m_name).first()
-            if not m_index:
+            m_index = lookup.municipality_by_name(m_name)
+            if m_index is None:
                 print(f'Невалидна община в област {d_name}: {m_name}')
+                metrics.rejected()
                 continue
 
-            s_index = session.query(Settlement.id).filter_by(name=s_name).filter_by(municipality_id=m_index[0]).first()
-            if not s_index:
+            s_index = lookup.settlement(m_index, s_name)
+            if s_index is None:
                 print(f'Невалидна селище в област {d_name}, община {d_name}: {m_name}')
+                metrics.rejected()
                 continue
 
             f_code = guess_institution_financing(school_name)
             d_code = guess_institution_details(school_name)
             s_code = guess_institution_status(school_name)
 
-            new_unit = Institution(code=school_code, name=school_name, settlement_id=s_index[0],
+            new_unit = Institution(code=school_code, name=school_name, settlement_id=s_index,
                                    financing_id=f_code, details_id=d_code,
                                    status_id=s_code)
 
@@ -150,7 +152,8 @@ def _load_nvo(unique_set: set, session: Session) -> list:
 
     file_name = path.join(RES_DIR, EXTERNAL)
     with open(file_name, 'r', encoding='utf-8') as file:
-        datum = json.load(file)
+        with metrics.phase('parse'):
+            datum = json.load(file)
 
         for school_code in datum:
 
@@ -158,30 +161,33 @@ def _load_nvo(unique_set: set, session: Session) -> list:
                 continue
 
             school_name = datum[school_code]['name']
-            s_name = _strip_location(datum[school_code]['city'])
-            m_name = _strip_location(datum[school_code]['municipality'])
-            d_name = _strip_location(datum[school_code]['region'])
+            s_name = _strip_location(datum[school_code]['city'], aliases)
+            m_name = _strip_location(datum[school_code]['municipality'], aliases)
+            d_name = _strip_location(datum[school_code]['region'], aliases)
 
-            d_index = session.query(District.id).filter_by(name=d_name).first()
-            if not d_index:
+            d_index = lookup.district(d_name)
+            if d_index is None:
                 print(f'Невалидна област: {d_name}')
+                metrics.rejected()
                 continue
 
-            m_index = session.query(Municipality.id).filter_by(name=m_name).first()
-            if not m_index:
+            m_index = lookup.municipality_by_name(m_name)
+            if m_index is None:
                 print(f'Невалидна община в област {d_name}: {m_name}')
+                metrics.rejected()
                 continue
 
-            s_index = session.query(Settlement.id).filter_by(name=s_name, municipality_id=m_index[0]).first()
-            if not s_index:
+            s_index = lookup.settlement(m_index, s_name)
+            if s_index is None:
                 print(f'Невалидна селище в област {d_name}, община {d_name}: {m_name}')
+                metrics.rejected()
                 continue
 
             f_code = guess_institution_financing(school_name)
             d_code = guess_institution_details(school_name)
             s_code = guess_institution_status(school_name)
 
-            new_unit = Institution(code=school_code, name=school_name, settlement_id=s_index[0],
+            new_unit = Institution(code=school_code, name=school_name, settlement_id=s_index,
                                    financing_id=f_code, details_id=d_code,
                                    status_id=s_code)
 
@@ -191,18 +197,23 @@ def _load_nvo(unique_set: set, session: Session) -> list:
     return rows
 
 
+def load(session: Session) -> int:
+
+    lookup = Lookup(session)
+    unique_set = set()
+    rows = _load_mon(unique_set, lookup)
+    rows.extend(_load_nvo(unique_set, lookup, Aliases(session)))
+    session.add_all(rows)
+    return len(rows)
+
+
 if __name__ == "__main__":
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
 
-        unique_set = set()
-        rows = _load_mon(unique_set, session)
-        rows.extend(_load_nvo(unique_set, session))
-        if not rows:
+        if not load(session):
             sys.exit(0)
-
-        session.add_all(rows)
         session.commit()
 
         rows = session.query(Institution).filter_by(code='103503').all()
@@ -1,88 +1,80 @@
 #!/usr/bin/env python3
 
 from os import path
-import csv
 import sys
 from datetime import date
 
-from sqlalchemy import create_engine
+import numpy as np
 from sqlalchemy.orm import Session
 
-from models import Municipality, Moment, Literacy
+from database import create_engine
+from models import Municipality, Literacy
+from lookup import Lookup
+from bulk import copy_rows
+from infostat import read_table
 
 
 DATA_DIR = 'data/infostat.nsi.bg'
 
 IN_FILE = 'ГРАМОТНОСТ.csv'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [path.join(DATA_DIR, IN_FILE)]
+TABLES = [Literacy]
+
 
 def _load(session: Session):
 
     rows = list()
+    lookup = Lookup(session)
 
-    file_path = path.join(DATA_DIR, IN_FILE)
-    with open(file_path, newline='') as csv_file:
-        spam = csv.reader(csv_file, delimiter=';')
-
-        next(spam)
-        tokens = next(spam)
-        next(spam)
+    table = read_table(path.join(DATA_DIR, IN_FILE))
 
-        date_indexes = []
-        for t in tokens:
-            if t:
-                c_date = date(int(t), 1, 1)
-                d_index = Moment.insert_date(c_date, session)
-            else:
-                d_index = None
+    years = table.years()
+    lookup.insert_moments(date(year, 1, 1) for year in years if year)
 
-            date_indexes.append(d_index)
+    date_indexes = [lookup.moment(date(year, 1, 1)) if year else None for year in years]
 
-        for row in spam:
-            m_name = row[0].lower().capitalize()
+    # Empty cells count as 0, rows without a total are skipped
+    missing = np.isnan(table.values)
+    counts = np.nan_to_num(table.values).astype(int)
 
-            municipality = session.query(
-                Municipality).filter_by(name=m_name).first()
-            if not municipality:
-                continue
+    for (label, *_), numbers, empty in zip(table.labels, counts, missing):
+        m_name = label.lower().capitalize()
 
-            for offs in [1, 4]:
+        m_index = lookup.municipality_by_name(m_name)
+        if m_index is None:
+            continue
 
-                d_index = date_indexes[offs]
+        for offs in [0, 3]:
 
-                try:
-                    total = int(row[offs + 0])
-                except ValueError:
-                    continue
+            d_index = date_indexes[offs]
 
-                try:
-                    literate = int(row[offs + 1])
-                except ValueError:
-                    literate = 0
+            if empty[offs]:
+                continue
 
-                try:
-                    illiterate = int(row[offs + 2])
-                except ValueError:
-                    illiterate = 0
+            (total, literate, illiterate) = numbers[offs:offs + 3]
 
-                new_node = Literacy(municipality.id, d_index, total,
-                                    literate, illiterate)
-                rows.append(new_node)
+            new_node = Literacy.values(m_index, d_index, total,
+                                       literate, illiterate)
+            rows.append(new_node)
 
     return rows
 
 
+def load(session: Session) -> int:
+
+    return copy_rows(session, Literacy, _load(session))
+
+
 if __name__ == "__main__":
 
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
 
-        rows = _load(session)
-        if not rows:
+        if not load(session):
             sys.exit(0)
-
-        session.add_all(rows)
         session.commit()
 
         rows = session.query(Literacy).all()
@@ -5,19 +5,24 @@ import glob
 from os import path
 import sys
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from models import Municipality
+from database import create_engine
 from models import SettlementAltitude
 from models import SettlementType
 from models import Settlement
+from lookup import Lookup
+import metrics
 
 
 # https://www.nsi.bg/nrnm/ekatte/archive
 
 DATA_DIR = 'data/nsi.bg'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [f'{DATA_DIR}/*/ek_atte.json']
+TABLES = [SettlementType, SettlementAltitude, Settlement]
+
 
 """
   code     Char 5   - Идентификационен код на териториалната единица.
@@ -60,14 +65,15 @@ DATA_DIR = 'data/nsi.bg'
 """
 
 
-def _process_one_year(dir: str, unique_filter: set, session: Session) -> list:
+def _process_one_year(dir: str, unique_filter: set, lookup: Lookup) -> list:
 
     a_json = None
     table_rows = list()
 
     file_path = path.join(dir, 'ek_atte.json')
     with open(file_path, 'r', encoding='utf-8') as file:
-        a_json = json.load(file)
+        with metrics.phase('parse'):
+            a_json = json.load(file)
 
     if not a_json:
         return table_rows
@@ -83,7 +89,7 @@ def _process_one_year(dir: str, unique_filter: set, session: Session) -> list:
         s_altitude = int(node['altitude'])
         m_abbrev = str(node['obshtina'])
 
-        m_index = session.query(Municipality.id).filter_by(abbrev=m_abbrev).one()[0]
+        m_index = lookup.municipality_abbrevs[m_abbrev]
 
         new_node = Settlement(id=s_code, name=s_name,
                                municipality_id=m_index,
@@ -95,43 +101,49 @@ def _process_one_year(dir: str, unique_filter: set, session: Session) -> list:
 
 def _load(dir_name: str, session: Session):
 
+    lookup = Lookup(session)
     unique_filter = set()
     rows = list()
 
     for dir in glob.iglob(f'{dir_name}/*'):
-        one = _process_one_year(dir, unique_filter, session)
+        one = _process_one_year(dir, unique_filter, lookup)
         rows.extend(one)
 
     return rows
 
+
+def load(session: Session) -> int:
+
+    e = [
+        SettlementAltitude(id=1, label='до 49 вкл.'),
+        SettlementAltitude(id=2, label='50 - 99 вкл.'),
+        SettlementAltitude(id=3, label='100 - 199 вкл.'),
+        SettlementAltitude(id=4, label='200 - 299 вкл.'),
+        SettlementAltitude(id=5, label='300 - 499 вкл.'),
+        SettlementAltitude(id=6, label='500 - 699 вкл.'),
+        SettlementAltitude(id=7, label='700 - 999 вкл.'),
+        SettlementAltitude(id=8, label='1000 и повече'),
+
+        SettlementType(id=1, label='гр.'),
+        SettlementType(id=3, label='с.'),
+        SettlementType(id=7, label='ман.'),
+    ]
+
+    session.add_all(e)
+    session.flush()
+
+    rows = _load(DATA_DIR, session)
+    session.add_all(rows)
+    return len(rows)
+
+
 if __name__ == "__main__":
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
 
-        e = [
-            SettlementAltitude(id=1, label='до 49 вкл.'),
-            SettlementAltitude(id=2, label='50 - 99 вкл.'),
-            SettlementAltitude(id=3, label='100 - 199 вкл.'),
-            SettlementAltitude(id=4, label='200 - 299 вкл.'),
-            SettlementAltitude(id=5, label='300 - 499 вкл.'),
-            SettlementAltitude(id=6, label='500 - 699 вкл.'),
-            SettlementAltitude(id=7, label='700 - 999 вкл.'),
-            SettlementAltitude(id=8, label='1000 и повече'),
-
-            SettlementType(id=1, label='гр.'),
-            SettlementType(id=3, label='с.'),
-            SettlementType(id=7, label='ман.'),
-        ]
-
-        session.add_all(e)
-        session.commit()
-
-        rows = _load(DATA_DIR, session)
-        if not rows:
+        if not load(session):
             sys.exit(0)
-
-        session.add_all(rows)
         session.commit()
 
         e = session.query(SettlementAltitude).filter_by(id=2).first()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import District, Municipality, Settlement
+from models import Institution, InstitutionDetails, InstitutionFinancing, InstitutionStatus
+from models import ExaminationSubject, Moment
+from fuzzy import BKTree
+
+
+class Lookup:
+    """
+    Reference tables loaded once into dictionaries, so the loaders can
+    resolve foreign keys in memory instead of with a query per input row.
+    """
+
+    def __init__(self, session: Session):
+
+        self.session = session
+
+        # name -> id, abbrev -> id
+        self.districts = {}
+        self.district_abbrevs = {}
+
+        # (district id, name) -> id, abbrev -> id, name -> id, abbrev -> name
+        self.municipalities = {}
+        self.municipality_abbrevs = {}
+        self.municipality_names = {}
+        self.municipality_by_abbrev = {}
+
+        # (municipality id, name) -> id, set of ids, the (municipality id,
+        # name) keys of more than one settlement
+        self.settlements = {}
+        self.settlement_ids = set()
+        self.settlement_twins = set()
+
+        # municipality id -> BKTree of its settlement names, built on first
+        # use, and (municipality id, name) -> id of the approximate matches
+        self.settlement_trees = {}
+        self.settlement_matches = {}
+
+        # code -> id
+        self.institutions = {}
+        self.financing_ids = set()
+        self.details_ids = set()
+        self.status_ids = set()
+
+        # subject -> id
+        self.subjects = {}
+
+        # date -> id
+        self.moments = {}
+
+        self.reload()
+
+    def reload(self):
+
+        session = self.session
+
+        for d_id, name, abbrev in session.execute(
+                select(District.id, District.name, District.abbrev).order_by(District.id)):
+            self.districts.setdefault(name, d_id)
+            self.district_abbrevs.setdefault(abbrev, d_id)
+
+        for m_id, name, abbrev, d_id in session.execute(
+                select(Municipality.id, Municipality.name, Municipality.abbrev,
+                       Municipality.district_id).order_by(Municipality.id)):
+            self.municipalities.setdefault((d_id, name), m_id)
+            self.municipality_abbrevs.setdefault(abbrev, m_id)
+            self.municipality_names.setdefault(name, m_id)
+            self.municipality_by_abbrev.setdefault(abbrev, name)
+
+        for s_id, name, m_id in session.execute(
+                select(Settlement.id, Settlement.name,
+                       Settlement.municipality_id).order_by(Settlement.id)):
+            if (m_id, name) in self.settlements:
+                self.settlement_twins.add((m_id, name))
+            self.settlements.setdefault((m_id, name), s_id)
+            self.settlement_ids.add(s_id)
+
+        for i_id, code in session.execute(
+                select(Institution.id, Institution.code).order_by(Institution.id)):
+            self.institutions.setdefault(code, i_id)
+
+        self.financing_ids = set(session.scalars(select(InstitutionFinancing.id)))
+        self.details_ids = set(session.scalars(select(InstitutionDetails.id)))
+        self.status_ids = set(session.scalars(select(InstitutionStatus.id)))
+
+        for s_id, subject in session.execute(
+                select(ExaminationSubject.id, ExaminationSubject.subject).order_by(ExaminationSubject.id)):
+            self.subjects.setdefault(subject, s_id)
+
+        for m_id, moment in session.execute(select(Moment.id, Moment.date)):
+            self.moments[moment] = m_id
+
+    def district(self, name: str) -> int | None:
+        return self.districts.get(name)
+
+    def district_by_abbrev(self, abbrev: str) -> int | None:
+        return self.district_abbrevs.get(abbrev)
+
+    def municipality(self, dist_name: str | None, mun_name: str | None) -> int | None:
+        d_index = self.districts.get(dist_name)
+        if d_index is None:
+            return None
+        return self.municipalities.get((d_index, mun_name))
+
+    def municipality_by_name(self, name: str) -> int | None:
+        return self.municipality_names.get(name)
+
+    def settlement(self, m_index: int, name: str) -> int | None:
+        return self.settlements.get((m_index, name))
+
+    def settlement_like(self, m_index: int, name: str) -> int | None:
+        """
+        Like settlement(), but a name which is not found is matched
+        against the settlements of the municipality, as the only closest
+        name within one edit per four letters. A name of two settlements
+        of the municipality is no match. Every approximate match is
+        reported once.
+        """
+
+        s_index = self.settlements.get((m_index, name))
+        if s_index is not None:
+            return s_index
+
+        key = (m_index, name)
+        if key not in self.settlement_matches:
+            self.settlement_matches[key] = self._settlement_like(m_index, name)
+
+        return self.settlement_matches[key]
+
+    def _settlement_like(self, m_index: int, name: str) -> int | None:
+
+        # A station, like 'Елин пелин (гара ...)', is a place of its own,
+        # its name is not cut to the one of the town
+        tree = self.settlement_trees.get(m_index)
+        if tree is None:
+            tree = BKTree(n for m_id, n in self.settlements if m_id == m_index)
+            self.settlement_trees[m_index] = tree
+
+        found = tree.search(name, max(1, len(name) // 4))
+        if not found:
+            return None
+
+        closest = [n for d, n in found if d == found[0][0]]
+        if len(closest) > 1 or (m_index, closest[0]) in self.settlement_twins:
+            print(f'Не приемам селище {name} за нито едно от {", ".join(closest)}')
+            return None
+
+        print(f'Приемам селище {name} за {closest[0]}')
+        return self.settlements[(m_index, closest[0])]
+
+    def institution(self, code: str) -> int | None:
+        return self.institutions.get(code)
+
+    def subject(self, subject: str) -> int | None:
+        return self.subjects.get(subject)
+
+    def moment(self, moment: date) -> int | None:
+        d_index = self.moments.get(moment)
+        if d_index is None:
+            self.insert_moments([moment])
+            d_index = self.moments.get(moment)
+        return d_index
+
+    def insert_moments(self, moments) -> None:
+        missing = [m for m in moments if m not in self.moments]
+        if missing:
+            self.moments.update(Moment.insert_dates(missing, self.session))
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+# Agent memory of the Vanna agent, kept in a SQLite file between restarts.
+# Every question and text memory has a vector of its character trigrams,
+# the vectors of all of them are rows of a NumPy matrix which a search
+# multiplies with the vector of the question. There is no limit on the
+# number of memories, the ones which are not found useful are forgotten.
+
+import asyncio
+import json
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import MetaData, Table, Column, String, Integer, Float, LargeBinary
+from sqlalchemy import select, insert, delete, update, bindparam
+from vanna.capabilities.agent_memory import AgentMemory, ToolMemory, TextMemory
+from vanna.capabilities.agent_memory import ToolMemorySearchResult, TextMemorySearchResult
+
+from database import create_engine
+
+
+URL = 'sqlite:///memory.sqlite'
+
+# Length of the vectors. The matrix has a column per memory and a row per
+# trigram code, a search reads only the rows of the trigrams of the
+# question, well under a millisecond for 20000 memories
+DIM = 256
+
+# A memory is forgotten after this many days without being found, every
+# search which finds it gives it as many days more
+IDLE_DAYS = 30
+
+# How often the searches are written down and the old memories forgotten
+FLUSH_SECONDS = 60
+EVICT_SECONDS = 3600
+
+metadata = MetaData()
+
+table = Table(
+    'memory', metadata,
+    Column('id', String, primary_key=True),
+    Column('kind', String, nullable=False),
+    Column('body', String, nullable=False),
+    Column('vector', LargeBinary, nullable=False),
+    Column('saved', Float, nullable=False),
+    Column('used', Float, nullable=False),
+    Column('hits', Integer, nullable=False),
+)
+
+
+def embed(line: str) -> np.ndarray:
+    """ Hashed character trigrams of the words of line, a vector of length 1 """
+
+    words = f' {" ".join(line.lower().split())} '
+    codes = [zlib.crc32(words[i:i + 3].encode('utf-8')) % DIM for i in range(len(words) - 2)]
+    vector = np.bincount(codes, minlength=DIM).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Index:
+    """ Memories of one kind, a row of the arrays each """
+
+    def __init__(self, model):
+        self.model = model
+        self.items = []
+        self.rows = {}
+        self.tools = {}
+        self.vectors = np.zeros((DIM, 64), np.float32)
+        self.codes = np.zeros(64, np.int32)
+        self.found = np.zeros(64, bool)
+        self.saved = np.zeros(64)
+        self.used = np.zeros(64)
+        self.hits = np.zeros(64, np.int64)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _grow(self) -> None:
+        for name in ('vectors', 'codes', 'found', 'saved', 'used', 'hits'):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)], axis=array.ndim - 1))
+
+    def add(self, item, vector: np.ndarray, saved: float, used: float, hits: int) -> None:
+
+        row = len(self.items)
+        if row == len(self.hits):
+            self._grow()
+
+        # Only successful tool uses are searched for
+        tool = getattr(item, 'tool_name', '')
+        self.vectors[:, row] = vector
+        self.codes[row] = self.tools.setdefault(tool, len(self.tools))
+        self.found[row] = getattr(item, 'success', True)
+        self.saved[row] = saved
+        self.used[row] = used
+        self.hits[row] = hits
+        self.items.append(item)
+        self.rows[item.memory_id] = row
+
+    def remove(self, memory_id: str) -> bool:
+
+        row = self.rows.pop(memory_id, None)
+        if row is None:
+            return False
+
+        # The last row takes the place of the removed one
+        last = len(self.items) - 1
+        if row != last:
+            for array in (self.vectors, self.codes, self.found, self.saved, self.used, self.hits):
+                array[..., row] = array[..., last]
+            self.items[row] = self.items[last]
+            self.rows[self.items[row].memory_id] = row
+        self.items.pop()
+        return True
+
+    def search(self, vector: np.ndarray, limit: int, threshold: float, tool: str = None) -> list:
+        """ (row, similarity) of the limit most similar memories, the best first """
+
+        n = len(self.items)
+        if n == 0 or limit <= 0:
+            return []
+
+        words = np.flatnonzero(vector)
+        scores = vector[words] @ self.vectors[words, :n]
+        mask = self.found[:n]
+        if tool is not None:
+            mask = mask & (self.codes[:n] == self.tools.get(tool, -1))
+        scores = np.where(mask, scores, -1.0)
+
+        k = min(limit, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if scores[row] >= threshold]
+
+    def recent(self, limit: int) -> list:
+        n = len(self.items)
+        return [self.items[row] for row in np.argsort(-self.saved[:n], kind='stable')[:limit]]
+
+    def idle(self, now: float) -> list:
+        """ Memories which have not been found for longer than they deserve """
+
+        n = len(self.items)
+        expired = now - self.used[:n] > IDLE_DAYS * 86400 * (1 + self.hits[:n])
+        return [self.items[row].memory_id for row in np.flatnonzero(expired)]
+
+
+class VectorAgentMemory(AgentMemory):
+    """ AgentMemory in the database of url, SQLite file URL by default """
+
+    def __init__(self, url: str = None):
+        self.engine = create_engine(url or URL)
+        metadata.create_all(self.engine)
+
+        self.indexes = {'tool': _Index(ToolMemory), 'text': _Index(TextMemory)}
+        self.dirty = set()
+        self.flushed = self.evicted = time.time()
+        self._lock = asyncio.Lock()
+        self._writes = asyncio.Lock()
+
+        with self.engine.connect() as conn:
+            for row in conn.execute(select(table)):
+                index = self.indexes[row.kind]
+                index.add(index.model(**json.loads(row.body)), np.frombuffer(row.vector, np.float32),
+                          row.saved, row.used, row.hits)
+        self._store(deleted=self._idle(time.time()))
+
+    def _store(self, rows: list = (), values: list = (), deleted: list = ()) -> None:
+        """ Insert rows, write down values of the searches and delete the deleted ids """
+
+        if rows or values or deleted:
+            with self.engine.begin() as conn:
+                if rows:
+                    conn.execute(insert(table), rows)
+                if values:
+                    conn.execute(update(table).where(table.c.id == bindparam('key')), values)
+                if deleted:
+                    conn.execute(delete(table).where(table.c.id.in_(deleted)))
+
+    async def _write(self, rows: list = (), values: list = (), deleted: list = ()) -> None:
+
+        # Called right after self._lock is released, the writes queue up
+        # in the order of the changes of the indexes
+        async with self._writes:
+            await asyncio.to_thread(self._store, rows, values, deleted)
+
+    def _add(self, kind: str, item, line: str) -> dict:
+        """ Add item to the index of kind, its row for _store() """
+
+        now = time.time()
+        vector = embed(line)
+        self.indexes[kind].add(item, vector, now, now, 0)
+        return {'id': item.memory_id, 'kind': kind, 'body': item.model_dump_json(), 'vector': vector.tobytes(),
+                'saved': now, 'used': now, 'hits': 0}
+
+    def _found(self, index: _Index, rows: list) -> None:
+        """ Count a search which found the memories at rows """
+
+        now = time.time()
+        for row, _ in rows:
+            index.used[row] = now
+            index.hits[row] += 1
+            self.dirty.add(index.items[row].memory_id)
+
+    def _dirty(self) -> list:
+        """ Values of the searches since the last flush, for _store() """
+
+        values = []
+        for memory_id in self.dirty:
+            for index in self.indexes.values():
+                row = index.rows.get(memory_id)
+                if row is not None:
+                    values.append({'key': memory_id, 'used': float(index.used[row]), 'hits': int(index.hits[row])})
+
+        self.dirty.clear()
+        self.flushed = time.time()
+        return values
+
+    def _delete(self, kind: str, memory_ids: list) -> list:
+
+        deleted = [m for m in memory_ids if self.indexes[kind].remove(m)]
+        self.dirty.difference_update(deleted)
+        return deleted
+
+    def _idle(self, now: float) -> list:
+
+        deleted = []
+        for kind, index in self.indexes.items():
+            deleted += self._delete(kind, index.idle(now))
+        self.evicted = now
+        return deleted
+
+    def _due(self) -> dict:
+        """ The searches to write down and the memories to forget, when it is time """
+
+        now = time.time()
+        due = {}
+        if now - self.flushed > FLUSH_SECONDS:
+            due['values'] = self._dirty()
+        if now - self.evicted > EVICT_SECONDS:
+            due['deleted'] = self._idle(now)
+        return due
+
+    def close(self) -> None:
+        """ Write down the searches since the last flush """
+
+        self._store(values=self._dirty())
+
+    @staticmethod
+    def _now_iso() -> str:
+        return datetime.now().isoformat()
+
+    async def save_tool_usage(self, question, tool_name, args, context, success=True, metadata=None) -> None:
+
+        item = ToolMemory(memory_id=str(uuid.uuid4()), question=question, tool_name=tool_name, args=args,
+                          timestamp=self._now_iso(), success=success, metadata=metadata or {})
+        async with self._lock:
+            rows = [self._add('tool', item, question)]
+            due = self._due()
+        await self._write(rows, **due)
+
+    async def save_text_memory(self, content, context) -> TextMemory:
+
+        item = TextMemory(memory_id=str(uuid.uuid4()), content=content, timestamp=self._now_iso())
+        async with self._lock:
+            rows = [self._add('text', item, content)]
+            due = self._due()
+        await self._write(rows, **due)
+        return item
+
+    async def search_similar_usage(self, question, context, *, limit=10, similarity_threshold=0.7,
+                                   tool_name_filter=None) -> list:
+
+        index = self.indexes['tool']
+        async with self._lock:
+            rows = index.search(embed(question), limit, similarity_threshold, tool_name_filter)
+            self._found(index, rows)
+            results = [ToolMemorySearchResult(memory=index.items[row], similarity_score=score, rank=rank)
+                       for rank, (row, score) in enumerate(rows, start=1)]
+            due = self._due()
+        if due:
+            await self._write(**due)
+        return results
+
+    async def search_text_memories(self, query, context, *, limit=10, similarity_threshold=0.7) -> list:
+
+        index = self.indexes['text']
+        async with self._lock:
+            rows = index.search(embed(query), limit, similarity_threshold)
+            self._found(index, rows)
+            results = [TextMemorySearchResult(memory=index.items[row], similarity_score=score, rank=rank)
+                       for rank, (row, score) in enumerate(rows, start=1)]
+            due = self._due()
+        if due:
+            await self._write(**due)
+        return results
+
+    async def get_recent_memories(self, context, limit=10) -> list:
+        async with self._lock:
+            return self.indexes['tool'].recent(limit)
+
+    async def get_recent_text_memories(self, context, limit=10) -> list:
+        async with self._lock:
+            return self.indexes['text'].recent(limit)
+
+    async def delete_by_id(self, context, memory_id) -> bool:
+        async with self._lock:
+            deleted = self._delete('tool', [memory_id])
+        await self._write(deleted=deleted)
+        return bool(deleted)
+
+    async def delete_text_memory(self, context, memory_id) -> bool:
+        async with self._lock:
+            deleted = self._delete('text', [memory_id])
+        await self._write(deleted=deleted)
+        return bool(deleted)
+
+    async def clear_memories(self, context, tool_name=None, before_date=None) -> int:
+        """ Tool memories of tool_name, and text memories when it is not given, older than before_date """
+
+        def _old(item) -> bool:
+            return before_date is None or (item.timestamp or '') < before_date
+
+        async with self._lock:
+            tools = [m.memory_id for m in self.indexes['tool'].items
+                     if (tool_name is None or m.tool_name == tool_name) and _old(m)]
+            texts = [m.memory_id for m in self.indexes['text'].items if tool_name is None and _old(m)]
+            deleted = self._delete('tool', tools) + self._delete('text', texts)
+        await self._write(deleted=deleted)
+        return len(deleted)
+
+
+if __name__ == "__main__":
+
+    # Memories of the agent, like './memory.py население на общините'
+    memory = VectorAgentMemory()
+    question = ' '.join(sys.argv[1:])
+    for kind, index in memory.indexes.items():
+        print(f'{kind:8} {len(index):8} спомена')
+        if question:
+            for row, score in index.search(embed(question), 10, 0.0):
+                item = index.items[row]
+                print(f'{score:8.3f} {getattr(item, "question", None) or item.content}')
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+# Where the time of a build goes, written as a JSON report per build
+
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+
+REPORT_DIR = 'reports'
+
+# The table a statement works on, the first one after any of these words
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|COPY|VIEW)\s+'
+                    r'(?:CONCURRENTLY\s+|IF\s+(?:NOT\s+)?EXISTS\s+)?"?(\w+)', re.IGNORECASE)
+
+# Stage of the current thread
+_local = threading.local()
+
+
+def _table(statement: str) -> str:
+
+    match = _TABLE.search(statement)
+    if match:
+        return match.group(1)
+
+    words = statement.split(None, 1)
+    return words[0].upper() if words else ''
+
+
+def _peak_rss() -> int:
+    """
+    Largest resident set in kB of this process or of a worker process. It
+    covers the loaders running at the same time, so it goes only into the
+    total of a report, not into its stages.
+    """
+
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+class Stage:
+    """
+    Numbers of one loader. phases has the seconds of parse, resolve and
+    write, resolve being whatever the loader does besides the other two.
+    statements has a [count, seconds] pair per table.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.rows = 0
+        self.rejected = 0
+        self.input_bytes = 0
+        self.phases = defaultdict(float)
+        self.statements = defaultdict(lambda: [0, 0.0])
+        self.phase = None
+
+    def statement(self, table: str, seconds: float) -> None:
+        counts = self.statements[table]
+        counts[0] += 1
+        counts[1] += seconds
+
+    def as_dict(self) -> dict:
+
+        phases = dict(self.phases)
+        phases['resolve'] = max(0.0, self.seconds - sum(phases.values()))
+
+        return {
+            'seconds': round(self.seconds, 3),
+            'rows': self.rows,
+            'rows_per_second': round(self.rows / self.seconds) if self.seconds else None,
+            'rejected': self.rejected,
+            'input_bytes': self.input_bytes,
+            'phases': {name: round(seconds, 3) for name, seconds in phases.items()},
+            'statements': {table: {'count': count, 'seconds': round(seconds, 3)}
+                           for table, (count, seconds) in sorted(self.statements.items())},
+        }
+
+
+def _current() -> Stage | None:
+    return getattr(_local, 'stage', None)
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Count the time of the block to the phase name of the current stage.
+    A phase inside another one takes its time from the outer phase. Does
+    nothing outside of a stage, when a loader runs on its own.
+    """
+
+    stage = _current()
+    if stage is None or stage.phase == name:
+        yield
+        return
+
+    outer = stage.phase
+    stage.phase = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage.phase = outer
+        stage.phases[name] += elapsed
+        if outer:
+            stage.phases[outer] -= elapsed
+
+
+def rejected(rows: int = 1) -> None:
+    """ Count input rows which the current stage could not load """
+
+    stage = _current()
+    if stage is not None:
+        stage.rejected += rows
+
+
+def statement(table: str, seconds: float) -> None:
+    """ Count a statement which does not go through the engine, like COPY """
+
+    stage = _current()
+    if stage is not None:
+        stage.statement(table, seconds)
+
+
+class Report:
+    """ Stages of one build or update, with the statements they ran on engine """
+
+    def __init__(self, command: str, engine):
+        self.command = command
+        self.engine = engine
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = {}
+
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info['metrics_start'] = time.perf_counter()
+
+    @staticmethod
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stage = _current()
+        if stage is not None:
+            stage.statement(_table(statement), time.perf_counter() - conn.info['metrics_start'])
+
+    @contextmanager
+    def stage(self, name: str):
+        """ Count everything the current thread does in the block to the stage name """
+
+        stage = self.stages[name] = Stage(name)
+        _local.stage = stage
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - start
+            _local.stage = None
+
+    def write(self) -> str:
+        """ Save the report under REPORT_DIR, returns the name of the file """
+
+        event.remove(self.engine, 'before_cursor_execute', self._before)
+        event.remove(self.engine, 'after_cursor_execute', self._after)
+
+        report = {
+            'command': self.command,
+            'started': self.started.isoformat(timespec='seconds'),
+            'database': self.engine.dialect.name,
+            'seconds': round(time.perf_counter() - self.start, 3),
+            'peak_rss_kb': _peak_rss(),
+            'stages': {name: stage.as_dict() for name, stage in self.stages.items()},
+        }
+
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        file_name = os.path.join(REPORT_DIR, f'{self.command}-{self.started:%Y%m%d-%H%M%S}.json')
+        with open(file_name, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+        return file_name
+
+
+def compare(old: dict, new: dict) -> None:
+    """ Print the stages of two reports side by side """
+
+    print(f'{"":16} {"преди":>9} {"после":>9} {"":>7} {"заявки":>15} {"реда":>21}')
+    for name, stage in new['stages'].items():
+        before = old['stages'].get(name)
+        if before is None:
+            print(f'{name:16} {"":>9} {stage["seconds"]:8.2f}s')
+            continue
+
+        ratio = stage['seconds'] / before['seconds'] if before['seconds'] else 0
+        count = sum(s['count'] for s in stage['statements'].values())
+        old_count = sum(s['count'] for s in before['statements'].values())
+        print(f'{name:16} {before["seconds"]:8.2f}s {stage["seconds"]:8.2f}s {ratio:6.2f}x '
+              f'{old_count:7} {count:7} {before["rows"]:10} {stage["rows"]:10}')
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) != 3:
+        print(f'{sys.argv[0]} стар-отчет.json нов-отчет.json')
+        sys.exit(1)
+
+    reports = []
+    for file_name in sys.argv[1:]:
+        with open(file_name, encoding='utf-8') as file:
+            reports.append(json.load(file))
+
+    compare(*reports)
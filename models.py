@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 
-from datetime import date
+import datetime
 
 from sqlalchemy_utils import database_exists, create_database, drop_database
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import select, MetaData
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from sqlalchemy import Column, Integer, String, Date, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, Numeric, Float, ForeignKey, Index
+from sqlalchemy import PrimaryKeyConstraint
 from sqlalchemy.orm import relationship, Session
 from sqlalchemy.orm import DeclarativeBase
 
+from database import create_engine
+
 
 # https://github.com/sqlalchemy/alembic/discussions/1559
 class Base(DeclarativeBase):
@@ -102,27 +107,32 @@ class SettlementAltitude(Base):
 
 class Settlement(Base):
     __tablename__ = "settlement"
-    __table_args__ = {
-        'comment':
-        """
-            Таблица, съдържаща описанието на населените мяста.
-
-            Населено място е исторически и функционално обособена територия,
-            определена с наличието на постоянно живеещо население, строителни
-            граници или землищни и строителни граници и необходимата социална и
-            инженерна инфраструктура.
-            Населените места се делят на градове и села и подлежат на регистрация
-            в единния класификатор на административно-териториалните и
-            териториални единици.
-        """
-    }
+    __table_args__ = (
+        Index('ix_settlement_municipality', 'municipality_id'),
+        Index('ix_settlement_name', 'name'),
+        {
+            'comment':
+            """
+                Таблица, съдържаща описанието на населените мяста.
+
+                Населено място е исторически и функционално обособена територия,
+                определена с наличието на постоянно живеещо население, строителни
+                граници или землищни и строителни граници и необходимата социална и
+                инженерна инфраструктура.
+                Населените места се делят на градове и села и подлежат на регистрация
+                в единния класификатор на административно-териториалните и
+                териториални единици.
+            """
+        }
+    )
 
     c = """
             Уникален идентификатор на населеното мястно (settlement).
             Използва се като външен ключ (foreign key) в свързаните
             таблици:
             - като учебно заведение (училище) (institution)
-            - преброяване (census).
+            - преброяване (census)
+            - месечен брой на населението (monthly_population).
         """
     id = Column(Integer, primary_key=True, autoincrement=True, comment=c)
 
@@ -153,6 +163,8 @@ class Settlement(Base):
 
     institution = relationship('Institution', back_populates='settlement', uselist=True)
     census = relationship('Census', back_populates='settlement', uselist=True)
+    monthly_population = relationship('MonthlyPopulation', back_populates='settlement', uselist=True)
+    statistic = relationship('Statistic', back_populates='settlement', uselist=True)
 
     def __repr__(self) -> str:
         return f"Settlement<{self.name}>"
@@ -160,18 +172,21 @@ class Settlement(Base):
 
 class Municipality(Base):
     __tablename__ = "municipality"
-    __table_args__ = {
-        'comment':
-        """
-            Таблица, съдържаща описанието на община (municipality).
-
-            Общината е административно-териториалните единици, в които основно
-            се осъществява местното самоуправление в България.
-            Общината се състои от едно или повече съседни населени места.
-            Територия на общината е територията на включените в нея населени
-            места.
-        """
-    }
+    __table_args__ = (
+        Index('ix_municipality_district', 'district_id'),
+        {
+            'comment':
+            """
+                Таблица, съдържаща описанието на община (municipality).
+
+                Общината е административно-териториалните единици, в които основно
+                се осъществява местното самоуправление в България.
+                Общината се състои от едно или повече съседни населени места.
+                Територия на общината е територията на включените в нея населени
+                места.
+            """
+        }
+    )
 
     c = """
             Уникален идентификатор за община (municipality).
@@ -182,6 +197,7 @@ class Municipality(Base):
             - Област (district)
             - Населено място (settlement)
             - Преброяване (census)
+            - Месечен брой на населението (monthly_population)
             - Майчин език (mother_tongue)
             - Етничека принадлежност (ethnicity)
             - Религия (religion)
@@ -201,11 +217,13 @@ class Municipality(Base):
     district = relationship('District', back_populates='municipality')
     settlement = relationship('Settlement', back_populates='municipality', uselist=True)
     census = relationship('Census', back_populates='municipality', uselist=True)
+    monthly_population = relationship('MonthlyPopulation', back_populates='municipality', uselist=True)
     mother_tongue = relationship('MotherTongue', back_populates='municipality', uselist=True)
     ethnicity = relationship('Ethnicity', back_populates='municipality', uselist=True)
     religion = relationship('Religion', back_populates='municipality', uselist=True)
     education = relationship('Education', back_populates='municipality', uselist=True)
     literacy = relationship('Literacy', back_populates='municipality', uselist=True)
+    statistic = relationship('Statistic', back_populates='municipality', uselist=True)
 
     def __repr__(self) -> str:
         return f"Municipality<{self.abbrev}, {self.name}>"
@@ -239,6 +257,7 @@ class District(Base):
     name = Column(String(25), nullable=False, unique=True, comment='Име на областа')
 
     municipality = relationship('Municipality', back_populates='district', uselist=True)
+    statistic = relationship('Statistic', back_populates='district', uselist=True)
 
     def __repr__(self) -> str:
         return f"District<{self.abbrev}, {self.name}>"
@@ -339,19 +358,22 @@ class InstitutionStatus(Base):
 
 class Institution(Base):
     __tablename__ = "institution"
-    __table_args__ = {
-        'comment':
-        """
-            Таблицата съдържа информация за институциите в системата на
-            предучилищното и училищното образование в Република България:
-
-            - Държавни детски градини, държавни и общински училища и държавните и
-              общински центрове за специална образователна подкрепа
-            - Специализирани обслужващи звена
-            - Духовни училища
-            - Частни детски градини и училища
-        """
-    }
+    __table_args__ = (
+        Index('ix_institution_settlement', 'settlement_id'),
+        {
+            'comment':
+            """
+                Таблицата съдържа информация за институциите в системата на
+                предучилищното и училищното образование в Република България:
+
+                - Държавни детски градини, държавни и общински училища и държавните и
+                  общински центрове за специална образователна подкрепа
+                - Специализирани обслужващи звена
+                - Духовни училища
+                - Частни детски градини и училища
+            """
+        }
+    )
 
     c = """
             Уникален идентификационен код на учебната институция
@@ -442,26 +464,31 @@ class ExaminationSubject(Base):
 
 class Examination(Base):
     __tablename__ = "examination"
-    __table_args__ = {
-        'comment':
-        """
-            Таблица, съдържаща списък с резултатите от матите или държавен
-            зрелостен изпит в учебните заведения.
-
-            В края на учебната година се държи матура по два предмета –
-            задължително по Български език и литература, а вторият предмет
-            е по избор на зрелостника от следните дисциплини:
-            - математика;
-            - чужд език (по избор: английски, руски, немски, френски, испански,
-              италиански);
-            - история и цивилизация;
-            - география и икономика;
-            - философски цикъл;
-            - химия и опазване на околната среда;
-            - биология и здравно образование;
-            - физика и астрономия.
-        """
-    }
+    __table_args__ = (
+        Index('uq_examination_institution_date_subject_grade',
+              'institution_id', 'date_id', 'subject_id', 'grade', unique=True),
+        Index('ix_examination_subject_date_score', 'subject_id', 'date_id', 'score'),
+        {
+            'comment':
+            """
+                Таблица, съдържаща списък с резултатите от матите или държавен
+                зрелостен изпит в учебните заведения.
+
+                В края на учебната година се държи матура по два предмета –
+                задължително по Български език и литература, а вторият предмет
+                е по избор на зрелостника от следните дисциплини:
+                - математика;
+                - чужд език (по избор: английски, руски, немски, френски, испански,
+                  италиански);
+                - история и цивилизация;
+                - география и икономика;
+                - философски цикъл;
+                - химия и опазване на околната среда;
+                - биология и здравно образование;
+                - физика и астрономия.
+            """
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -523,6 +550,7 @@ class Moment(Base):
             Използва се като външен ключ (foreign key) в свързаните таблици:
             - резултат от изпит (examination)
             - преброяване на населението (census)
+            - месечен брой на населението (monthly_population)
             - майчин език (мother_тongue)
             - етническа принадлежност (ethnicity)
             - изповядвана религия (religion)
@@ -531,45 +559,81 @@ class Moment(Base):
         """
     id = Column(Integer, primary_key=True, autoincrement=True, comment=c)
 
-    c = 'Дата на провеждане на преброяването или изпита'
+    c = 'Дата на провеждане на преброяването, изпита или месечния отчет'
     date = Column(Date, unique=True, comment=c)
 
     census = relationship('Census', back_populates='moment', uselist=True)
+    monthly_population = relationship('MonthlyPopulation', back_populates='moment', uselist=True)
     examination = relationship('Examination', back_populates='moment', uselist=True)
     mother_tongue = relationship('MotherTongue', back_populates='moment', uselist=True)
     ethnicity = relationship('Ethnicity', back_populates='moment', uselist=True)
     religion = relationship('Religion', back_populates='moment', uselist=True)
     education = relationship('Education', back_populates='moment', uselist=True)
     literacy = relationship('Literacy', back_populates='moment', uselist=True)
+    statistic = relationship('Statistic', back_populates='moment', uselist=True)
 
     def __repr__(self) -> str:
         return f"Moment<{self.date}>"
 
     @staticmethod
-    def insert_date(moment: date, session: Session) -> int:
+    def insert_date(moment: datetime.date, session: Session) -> int:
+        return Moment.insert_dates([moment], session).get(moment, -1)
 
-        d_index = session.query(Moment.id).filter_by(date=moment).first()
-        if not d_index:
-            m = Moment(date=moment)
-            session.add(m)
-            session.commit()
-            d_index = session.query(Moment.id).filter_by(date=moment).first()
+    @staticmethod
+    def _upsert_dates(moments: set, conn, insert) -> dict:
 
-        if d_index:
-            return d_index[0]
-        else:
-            return -1
+        values = [{'date': m} for m in sorted(moments)]
+        stmt = insert(Moment).values(values).on_conflict_do_nothing(
+            index_elements=['date']).returning(Moment.id, Moment.date)
 
+        indexes = {m: m_id for m_id, m in conn.execute(stmt)}
 
-class Census(Base):
-    __tablename__ = "census"
-    __table_args__ = {
-        'comment':
+        missing = moments - indexes.keys()
+        if missing:
+            stmt = select(Moment.id, Moment.date).where(Moment.date.in_(missing))
+            indexes.update({m: m_id for m_id, m in conn.execute(stmt)})
+
+        return indexes
+
+    @staticmethod
+    def insert_dates(moments, session: Session) -> dict:
         """
-            Таблица, съдържаща информация сързана с преброяванията на
-            населението в отделните общини в България за съответната година.
+        Resolve every date in moments to its id with one
+        INSERT ... ON CONFLICT DO NOTHING RETURNING statement plus one
+        SELECT for the dates that already existed or were inserted by a
+        concurrent loader. On PostgreSQL they are committed at once in a
+        short transaction of their own, so that concurrent loaders of the
+        same dates do not wait for each other until the end of their
+        load. A failed load leaves its dates behind then, which is
+        harmless as the upsert gives them the same ids next time. SQLite
+        has one writer, the dates go in with the facts there.
         """
-    }
+
+        moments = set(moments)
+        if not moments:
+            return dict()
+
+        engine = session.get_bind()
+        if engine.dialect.name == 'sqlite':
+            return Moment._upsert_dates(moments, session, sqlite_insert)
+
+        with engine.begin() as conn:
+            return Moment._upsert_dates(moments, conn, pg_insert)
+
+
+class Census(Base):
+    __tablename__ = "census"
+    __table_args__ = (
+        Index('ix_census_settlement_date', 'settlement_id', 'date_id'),
+        Index('ix_census_municipality_date', 'municipality_id', 'date_id'),
+        {
+            'comment':
+            """
+                Таблица, съдържаща информация сързана с преброяванията на
+                населението в отделните общини в България за съответната година.
+            """
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -593,16 +657,58 @@ class Census(Base):
         return f"Census<{self.settlement_id}, {self.date_id}>"
 
 
+class MonthlyPopulation(Base):
+    __tablename__ = "monthly_population"
+    __table_args__ = (
+        Index('ix_monthly_population_settlement_date', 'settlement_id', 'date_id'),
+        Index('ix_monthly_population_municipality_date', 'municipality_id', 'date_id'),
+        {
+            'comment':
+            """
+                Таблица, съдържаща месечния брой на адресно регистрираните лица
+                по постоянен и по настоящ адрес според ГРАО. За част от датите
+                има данни по населени места, за останалите само по общини. В
+                редовете за общината като цяло settlement_id е празно (NULL),
+                затова при сумиране трябва да се избира едното или другото.
+            """
+        }
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    c = 'Указател към таблицата с населените места, NULL за общината като цяло'
+    settlement_id = Column(Integer, ForeignKey("settlement.id", comment=c), nullable=True)
+
+    c = 'Улазател към таблицата на общините'
+    municipality_id = Column(Integer, ForeignKey("municipality.id", comment=c))
+
+    c = 'Указател към таблицата с датите на отчетите'
+    date_id = Column(Integer, ForeignKey("moment.id", comment=c))
+
+    permanent = Column(Integer, comment='Брой на жителите по постоянен адрес')
+    current = Column(Integer, comment='Брой на жителите по настоящ адрес')
+
+    settlement = relationship('Settlement', back_populates='monthly_population')
+    municipality = relationship('Municipality', back_populates='monthly_population')
+    moment = relationship('Moment', back_populates='monthly_population')
+
+    def __repr__(self) -> str:
+        return f"MonthlyPopulation<{self.settlement_id}, {self.municipality_id}, {self.date_id}>"
+
+
 class MotherTongue(Base):
     __tablename__ = "mother_tongue"
-    __table_args__ = {
-        'comment':
-        """
-            Таблица, съдържаща разпределението, в процентно съотношение
-            по майчен език, в съответната община и дата. Данните в колоните
-            са в проценти.
-        """
-    }
+    __table_args__ = (
+        Index('uq_mother_tongue_municipality_date', 'municipality_id', 'date_id', unique=True),
+        {
+            'comment':
+            """
+                Таблица, съдържаща разпределението, в процентно съотношение
+                по майчен език, в съответната община и дата. Данните в колоните
+                са в проценти.
+            """
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -627,38 +733,51 @@ class MotherTongue(Base):
                  turks: int, roma: int, other: int, cant_decide: int,
                  dont_answer: int, not_shown: int):
 
-        x = bulgarians + turks + roma + other + cant_decide + dont_answer + not_shown
-        if x != total:
-            print(f'език: общия брой се различва {total} != {x}')
-
-        self.municipality_id = m_id
-        self.date_id = d_id
-        self.bulgarians = round(float(bulgarians) * 100.0 / float(x))
-        self.turks = round(float(turks) * 100.0 / float(x))
-        self.roma = round(float(roma) * 100.0 / float(x))
-        self.other = round(float(other) * 100.0 / float(x))
-        self.cant_decide = round(float(cant_decide) * 100.0 / float(x))
-        self.dont_answer = round(float(dont_answer) * 100.0 / float(x))
-        self.not_shown = round(float(not_shown) * 100.0 / float(x))
+        (self.municipality_id, self.date_id, self.bulgarians, self.turks,
+         self.roma, self.other, self.cant_decide, self.dont_answer,
+         self.not_shown) = \
+            MotherTongue.values(m_id, d_id, total, bulgarians, turks, roma,
+                                other, cant_decide, dont_answer, not_shown)
 
         # x = self.bulgarians + self.turks + self.roma + self.other + \
         #     self.cant_decide + self.dont_answer + self.not_shown
         # if x != 100:
         #     print(f'език: общия процент {x} != 100')
 
+    @staticmethod
+    def values(m_id: int, d_id: int, total: int, bulgarians: int,
+               turks: int, roma: int, other: int, cant_decide: int,
+               dont_answer: int, not_shown: int) -> tuple:
+
+        x = bulgarians + turks + roma + other + cant_decide + dont_answer + not_shown
+        if x != total:
+            print(f'език: общия брой се различва {total} != {x}')
+
+        return (m_id, d_id,
+                round(float(bulgarians) * 100.0 / float(x)),
+                round(float(turks) * 100.0 / float(x)),
+                round(float(roma) * 100.0 / float(x)),
+                round(float(other) * 100.0 / float(x)),
+                round(float(cant_decide) * 100.0 / float(x)),
+                round(float(dont_answer) * 100.0 / float(x)),
+                round(float(not_shown) * 100.0 / float(x)))
+
     def __repr__(self):
         return f'Език<{self.municipality_id:3} български: {self.bulgarians:2}% турски: {self.turks:2}% ромски: {self.roma:2}%>'
 
 
 class Ethnicity(Base):
     __tablename__ = "ethnicity"
-    __table_args__ = {
-        'comment':
-        """
-            Таблица, съдържаща разпределението по етническа принадлежност,
-            в съответната община и дата. Данните в колоните са в проценти.
-        """
-    }
+    __table_args__ = (
+        Index('uq_ethnicity_municipality_date', 'municipality_id', 'date_id', unique=True),
+        {
+            'comment':
+            """
+                Таблица, съдържаща разпределението по етническа принадлежност,
+                в съответната община и дата. Данните в колоните са в проценти.
+            """
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -683,38 +802,51 @@ class Ethnicity(Base):
                  turks: int, roma: int, other: int, cant_decide: int,
                  dont_answer: int, not_shown: int):
 
-        x = bulgarians + turks + roma + other + cant_decide + dont_answer + not_shown
-        if x != total:
-            print(f'етност: общия брой се различва {total} != {x}')
-
-        self.municipality_id = m_id
-        self.date_id = d_id
-        self.bulgarians = round(float(bulgarians) * 100.0 / float(x))
-        self.turks = round(float(turks) * 100.0 / float(x))
-        self.roma = round(float(roma) * 100.0 / float(x))
-        self.other = round(float(other) * 100.0 / float(x))
-        self.cant_decide = round(float(cant_decide) * 100.0 / float(x))
-        self.dont_answer = round(float(dont_answer) * 100.0 / float(x))
-        self.not_shown = round(float(not_shown) * 100.0 / float(x))
+        (self.municipality_id, self.date_id, self.bulgarians, self.turks,
+         self.roma, self.other, self.cant_decide, self.dont_answer,
+         self.not_shown) = \
+            Ethnicity.values(m_id, d_id, total, bulgarians, turks, roma, other,
+                             cant_decide, dont_answer, not_shown)
 
         # x = self.bulgarians + self.turks + self.roma + self.other + \
         #     self.cant_decide + self.dont_answer + self.not_shown
         # if x != 100:
         #     print(f'етност: общия процент {x} != 100')
 
+    @staticmethod
+    def values(m_id: int, d_id: int, total: int, bulgarians: int,
+               turks: int, roma: int, other: int, cant_decide: int,
+               dont_answer: int, not_shown: int) -> tuple:
+
+        x = bulgarians + turks + roma + other + cant_decide + dont_answer + not_shown
+        if x != total:
+            print(f'етност: общия брой се различва {total} != {x}')
+
+        return (m_id, d_id,
+                round(float(bulgarians) * 100.0 / float(x)),
+                round(float(turks) * 100.0 / float(x)),
+                round(float(roma) * 100.0 / float(x)),
+                round(float(other) * 100.0 / float(x)),
+                round(float(cant_decide) * 100.0 / float(x)),
+                round(float(dont_answer) * 100.0 / float(x)),
+                round(float(not_shown) * 100.0 / float(x)))
+
     def __repr__(self):
         return f'Етнос<{self.municipality_id:3} българи: {self.bulgarians:2}% турци: {self.turks:2}% роми: {self.roma:2}%>'
 
 
 class Religion(Base):
     __tablename__ = "religion"
-    __table_args__ = {
-        'comment':
-        """
-            Таблица, съдържаща разпределението на населението по вероизповедание
-            в съответната община и дата. Данните в колоните са в проценти.
-        """
-    }
+    __table_args__ = (
+        Index('uq_religion_municipality_date', 'municipality_id', 'date_id', unique=True),
+        {
+            'comment':
+            """
+                Таблица, съдържаща разпределението на населението по вероизповедание
+                в съответната община и дата. Данните в колоните са в проценти.
+            """
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -740,41 +872,54 @@ class Religion(Base):
                  muslims: int, judean: int, other: int, none: int,
                  cant_decide: int, dont_answer: int, not_shown: int):
 
-        x = orthodox + muslims + judean + other + \
-            none + cant_decide + dont_answer + not_shown
-        if x != total:
-            print(f'религия: общия брой се различва {total} != {x}')
-
-        self.municipality_id = m_id
-        self.date_id = d_id
-        self.orthodox = round(float(orthodox) * 100.0 / float(x))
-        self.muslims = round(float(muslims) * 100.0 / float(x))
-        self.judean = round(float(judean) * 100.0 / float(x))
-        self.other = round(float(other) * 100.0 / float(x))
-        self.none = round(float(none) * 100.0 / float(x))
-        self.cant_decide = round(float(cant_decide) * 100.0 / float(x))
-        self.dont_answer = round(float(dont_answer) * 100.0 / float(x))
-        self.not_shown = round(float(not_shown) * 100.0 / float(x))
+        (self.municipality_id, self.date_id, self.orthodox, self.muslims,
+         self.judean, self.other, self.none, self.cant_decide,
+         self.dont_answer, self.not_shown) = \
+            Religion.values(m_id, d_id, total, orthodox, muslims, judean,
+                            other, none, cant_decide, dont_answer, not_shown)
 
         # x = self.orthodox + self.muslims + self.judean + self.other + \
         #     self.none + self.cant_decide + self.dont_answer + self.not_shown
         # if x != 100:
         #     print(f'религия: общия процент {x} != 100')
 
+    @staticmethod
+    def values(m_id: int, d_id: int, total: int, orthodox: int,
+               muslims: int, judean: int, other: int, none: int,
+               cant_decide: int, dont_answer: int, not_shown: int) -> tuple:
+
+        x = orthodox + muslims + judean + other + \
+            none + cant_decide + dont_answer + not_shown
+        if x != total:
+            print(f'религия: общия брой се различва {total} != {x}')
+
+        return (m_id, d_id,
+                round(float(orthodox) * 100.0 / float(x)),
+                round(float(muslims) * 100.0 / float(x)),
+                round(float(judean) * 100.0 / float(x)),
+                round(float(other) * 100.0 / float(x)),
+                round(float(none) * 100.0 / float(x)),
+                round(float(cant_decide) * 100.0 / float(x)),
+                round(float(dont_answer) * 100.0 / float(x)),
+                round(float(not_shown) * 100.0 / float(x)))
+
     def __repr__(self):
         return f'Религия<{self.municipality_id:3} християни: {self.orthodox:2}% мюслмани: {self.muslims:2}% юдеи: {self.judean:2}%>'
 
 
 class Education(Base):
     __tablename__ = "education"
-    __table_args__ = {
-        'comment':
-        """
-            Таблица, съдържаща разпределението на образователна структура на
-            населението на 7 и повече години по степен на образование,
-            община и дата. Данните в колоните са в проценти.
-        """
-    }
+    __table_args__ = (
+        Index('ix_education_municipality_date', 'municipality_id', 'date_id'),
+        {
+            'comment':
+            """
+                Таблица, съдържаща разпределението на образователна структура на
+                населението на 7 и повече години по степен на образование,
+                община и дата. Данните в колоните са в проценти.
+            """
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -798,36 +943,47 @@ class Education(Base):
     def __init__(self, m_id: int, d_id: int, total: int, university: int,
                  secondary: int, primary: int, elementary: int, none: int):
 
-        x = university + secondary + primary + elementary + none
-        if x != total:
-            print(f'образование: общия брой се различва {total} != {x}')
-
-        self.municipality_id = m_id
-        self.date_id = d_id
-        self.university = round(float(university) * 100.0 / float(x))
-        self.secondary = round(float(secondary) * 100.0 / float(x))
-        self.primary = round(float(primary) * 100.0 / float(x))
-        self.elementary = round(float(elementary) * 100.0 / float(x))
-        self.no_school = round(float(none) * 100.0 / float(x))
+        (self.municipality_id, self.date_id, self.university, self.secondary,
+         self.primary, self.elementary, self.no_school) = \
+            Education.values(m_id, d_id, total, university, secondary, primary,
+                             elementary, none)
 
         # x = self.university + self.secondary + \
         #     self.primary + self.elementary + self.no_school
         # if x != 100:
         #     print(f'образование: общия процент {x} != 100')
 
+    @staticmethod
+    def values(m_id: int, d_id: int, total: int, university: int,
+               secondary: int, primary: int, elementary: int, none: int) -> tuple:
+
+        x = university + secondary + primary + elementary + none
+        if x != total:
+            print(f'образование: общия брой се различва {total} != {x}')
+
+        return (m_id, d_id,
+                round(float(university) * 100.0 / float(x)),
+                round(float(secondary) * 100.0 / float(x)),
+                round(float(primary) * 100.0 / float(x)),
+                round(float(elementary) * 100.0 / float(x)),
+                round(float(none) * 100.0 / float(x)))
+
     def __repr__(self):
         return f'Образование<{self.municipality_id:3} Висше: {self.university:2}% Средно: {self.secondary:2}% Основно: {self.primary:2}%>'
 
 
 class Literacy(Base):
     __tablename__ = "literacy"
-    __table_args__ = {
-        'comment':
-        """
-            Таблица, съдържаща разпределението на грамотните и неграмотните по
-            община и дата. Данните в колоните са в проценти.
-        """
-    }
+    __table_args__ = (
+        Index('ix_literacy_municipality_date', 'municipality_id', 'date_id'),
+        {
+            'comment':
+            """
+                Таблица, съдържаща разпределението на грамотните и неграмотните по
+                община и дата. Данните в колоните са в проценти.
+            """
+        }
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
 
@@ -846,26 +1002,252 @@ class Literacy(Base):
     def __init__(self, m_id: int, d_id: int, total: int, literate: int,
                  iletarate: int):
 
-        x = literate + iletarate
-        if x != total:
-            print(f'грамотност: общия брой се различва {total} != {x}')
-
-        self.municipality_id = m_id
-        self.date_id = d_id
-        self.literate = round(float(literate) * 100.0 / float(x))
-        self.illiterate = round(float(iletarate) * 100.0 / float(x))
+        (self.municipality_id, self.date_id, self.literate, self.illiterate) = \
+            Literacy.values(m_id, d_id, total, literate, iletarate)
 
         # x = self.literate + self.illiterate
         # if x != 100:
         #     print(f'грамотност: общия процент {x} != 100')
 
+    @staticmethod
+    def values(m_id: int, d_id: int, total: int, literate: int,
+               iletarate: int) -> tuple:
+
+        x = literate + iletarate
+        if x != total:
+            print(f'грамотност: общия брой се различва {total} != {x}')
+
+        return (m_id, d_id,
+                round(float(literate) * 100.0 / float(x)),
+                round(float(iletarate) * 100.0 / float(x)))
+
     def __repr__(self):
         return f'Грамотност<{self.municipality_id:3} грамотни: {self.literate:2}% неграмотни: {self.illiterate:2}%>'
 
 
-if __name__ == "__main__":
+class Statistic(Base):
+    __tablename__ = "statistic"
+    __table_args__ = {
+        'comment':
+        """
+            Таблица, съдържаща показателите от останалите таблици на
+            infostat.nsi.bg, по един ред за всяка стойност. Всеки ред е за
+            страната, район, област, община или населено място. Указателите
+            към областта, общината и населеното място са попълнени според
+            вида на територията, за страната и районите са празни (NULL).
+            Сумирането е смислено само за редове с еднакви source и indicator.
+        """
+    }
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    c = 'Име на таблицата в infostat.nsi.bg, например НАСЕЛЕНИЕ ВЪЗРАСТ'
+    source = Column(String, comment=c)
+
+    c = 'Територията както е записана в източника'
+    territory = Column(String, comment=c)
+
+    c = 'Указател към таблицата на областите'
+    district_id = Column(Integer, ForeignKey("district.id", comment=c), nullable=True)
+
+    c = 'Улазател към таблицата на общините'
+    municipality_id = Column(Integer, ForeignKey("municipality.id", comment=c), nullable=True)
+
+    c = 'Указател към таблицата с населените места'
+    settlement_id = Column(Integer, ForeignKey("settlement.id", comment=c), nullable=True)
+
+    c = 'Указател към таблицата с датите, 1 януари на годината. NULL ако източникът няма година'
+    date_id = Column(Integer, ForeignKey("moment.id", comment=c), nullable=True)
+
+    c = """
+            Показател, мерна единица и категории (пол, възраст и т.н.),
+            разделени с ' / ', например 'брой / Мъже / 0 - 4'
+        """
+    indicator = Column(String, comment=c)
+
+    value = Column(Float, comment='Стойност на показателя')
+
+    district = relationship('District', back_populates='statistic')
+    municipality = relationship('Municipality', back_populates='statistic')
+    settlement = relationship('Settlement', back_populates='statistic')
+    moment = relationship('Moment', back_populates='statistic')
+
+    def __repr__(self) -> str:
+        return f"Statistic<{self.source}, {self.territory}, {self.indicator}: {self.value}>"
+
+
+class SchoolFact(Base):
+    __tablename__ = "school_fact"
+    __table_args__ = (
+        Index('ix_school_fact_subject_year', 'subject', 'year'),
+        Index('ix_school_fact_institution_code_date', 'institution_code', 'date'),
+        {
+            'comment':
+            """
+                Аналитична таблица. Всеки ред е резултат от изпит (таблицата
+                examination) заедно с името на учебното заведение, населеното
+                място, общината и областта, в които се намира, и последния
+                известен брой на населението на мястото. Позволява въпроси
+                за училищата без съединяване на таблици.
+            """
+        }
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    institution_id = Column(Integer, comment='Идентификатор на учебното заведение')
+    institution_code = Column(String(7), comment='Код на учебното заведение')
+    institution = Column(String, comment='Име на учебното заведение')
+
+    settlement_id = Column(Integer, comment='Идентификатор на населеното място, кодът му по ЕКАТТЕ')
+    settlement = Column(String, comment='Име на населеното място')
+    municipality_id = Column(Integer, comment='Идентификатор на общината')
+    municipality = Column(String, comment='Име на общината')
+    district_id = Column(Integer, comment='Идентификатор на областта')
+    district = Column(String, comment='Име на областта')
+
+    date = Column(Date, comment='Дата на изпита')
+    year = Column(Integer, comment='Година на изпита')
+    subject = Column(String, comment='Предмет на изпита')
+    grade = Column(Integer, comment='Клас на учениците')
+    score = Column(Numeric, comment='Резултат от изпита')
+    students = Column(Integer, comment='Брой ученици участвали на изпита')
+
+    population = Column(Integer, comment='Последен известен брой на населението на мястото по постоянен адрес')
+    population_year = Column(Integer, comment='Година на последния известен брой на населението')
+
+    def __repr__(self):
+        return f'SchoolFact<{self.institution}, {self.settlement}, {self.year}, {self.subject}: {self.score}>'
+
+
+class SettlementYearFact(Base):
+    __tablename__ = "settlement_year_fact"
+    __table_args__ = (
+        Index('uq_settlement_year_fact_settlement_date', 'settlement_id', 'date', unique=True),
+        {
+            'comment':
+            """
+                Аналитична таблица. Броят на населението на всяко населено
+                място за всяка година (от таблицата census) заедно с имената
+                и кодовете на общината и областта и последния известен брой
+                на населението на мястото.
+            """
+        }
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    settlement_id = Column(Integer, comment='Идентификатор на населеното място, кодът му по ЕКАТТЕ')
+    settlement = Column(String, comment='Име на населеното място')
+    municipality_id = Column(Integer, comment='Идентификатор на общината')
+    municipality_code = Column(String(5), comment='Код на общината')
+    municipality = Column(String, comment='Име на общината')
+    district_id = Column(Integer, comment='Идентификатор на областта')
+    district_code = Column(String(3), comment='Код на областта')
+    district = Column(String, comment='Име на областта')
+
+    date = Column(Date, comment='Дата на преброяването')
+    year = Column(Integer, comment='Година на преброяването')
+    permanent = Column(Integer, comment='Брой на населението по постоянен адрес')
+    current = Column(Integer, comment='Брой на населението по настоящ адрес')
+
+    population = Column(Integer, comment='Последен известен брой на населението на мястото по постоянен адрес')
+    population_year = Column(Integer, comment='Година на последния известен брой на населението')
+
+    def __repr__(self):
+        return f'SettlementYearFact<{self.settlement}, {self.year}: {self.permanent}>'
+
+
+class NameAlias(Base):
+    __tablename__ = "name_alias"
+    __table_args__ = {
+        'comment':
+        """
+            Служебна таблица. Изписване на имена на области, общини и
+            населени места в справките на ГРАО и МОН, което се различава
+            от това на НСИ.
+        """
+    }
+
+    id = Column(Integer, primary_key=True)
+    alias = Column(String, unique=True, comment='Име, както е изписано в източника, с малки букви')
+    name = Column(String, comment='Име според НСИ, с малки букви')
+
+    def __repr__(self):
+        return f'NameAlias<{self.alias} -> {self.name}>'
+
+
+class PlaceAlias(Base):
+    __tablename__ = "place_alias"
+    __table_args__ = {
+        'comment':
+        """
+            Служебна таблица. Населени места и общини, които в справките
+            на ГРАО са към друга област или община, отколкото според НСИ.
+            Празна област или община важи само за редове без такава, а
+            празно населено място - за всички места в общината.
+        """
+    }
+
+    id = Column(Integer, primary_key=True)
+    district = Column(String, comment='Област в източника')
+    municipality = Column(String, comment='Община в източника')
+    settlement = Column(String, comment='Населено място в източника, празно за цялата община')
+    new_district = Column(String, comment='Област според НСИ, празно ако не се променя')
+    new_municipality = Column(String, comment='Община според НСИ, празно ако не се променя')
+
+    def __repr__(self):
+        return f'PlaceAlias<{self.district}, {self.municipality}, {self.settlement} -> ' \
+               f'{self.new_district}, {self.new_municipality}>'
+
+
+class Manifest(Base):
+    __tablename__ = "build_manifest"
+    __table_args__ = {
+        'comment':
+        """
+            Служебна таблица. Контролна сума на входните файлове на всеки
+            зареждащ скрипт при последното успешно изпълнение. Не съдържа
+            данни за училища или населени места.
+        """
+    }
+
+    loader = Column(String, primary_key=True, comment='Име на зареждащия скрипт')
+    digest = Column(String, comment='SHA-256 на скрипта и входните му файлове')
+
+    def __repr__(self):
+        return f'Manifest<{self.loader}: {self.digest[:12]}>'
+
+
+# Fact tables which recreate() can split into one PostgreSQL partition
+# per date. bulk.copy_rows() adds the partitions as rows arrive.
+PARTITIONED = [Census.__tablename__, Examination.__tablename__]
+
+
+def _partitioned_metadata() -> MetaData:
+    """ Copy of Base.metadata with the PARTITIONED tables partitioned by date_id """
+
+    metadata = MetaData(naming_convention=Base.metadata.naming_convention)
+    for table in Base.metadata.sorted_tables:
+        table = table.to_metadata(metadata)
+        if table.name in PARTITIONED:
+            table.dialect_options['postgresql']['partition_by'] = 'LIST (date_id)'
+            # The primary key has to contain the partition key, it takes the
+            # place of the one of the copy on id
+            table.constraints.discard(table.primary_key)
+            table.c.date_id.primary_key = True
+            table.append_constraint(PrimaryKeyConstraint('id', 'date_id'))
+
+    return metadata
+
+
+def recreate(engine, partitioned: bool = False) -> None:
+    """
+    Drop the database of engine, if any, and create it with all tables.
+    With partitioned, on PostgreSQL, the PARTITIONED tables are created
+    as partitioned tables.
+    """
 
-    engine = create_engine("postgresql://localhost/infobg")
     if not database_exists(engine.url):
         create_database(engine.url)
     else:
@@ -873,5 +1255,13 @@ if __name__ == "__main__":
         create_database(engine.url)
 
     # Create all tables in the engine
-    Base.metadata.create_all(engine)
-    pass
+    if partitioned and engine.dialect.name == 'postgresql':
+        _partitioned_metadata().create_all(engine)
+    else:
+        Base.metadata.create_all(engine)
+
+
+if __name__ == "__main__":
+
+    engine = create_engine()
+    recreate(engine)
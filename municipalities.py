@@ -5,16 +5,21 @@ import glob
 from os import path
 import sys
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
+from database import create_engine
 from models import Municipality
-from models import District
+from lookup import Lookup
+import metrics
 
 # https://www.nsi.bg/nrnm/ekatte/archive
 
 DATA_DIR = 'data/nsi.bg'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [f'{DATA_DIR}/*/ek_obst.json']
+TABLES = [Municipality]
+
 
 """
   name      Char 25  - Наименование на общината
@@ -24,14 +29,15 @@ DATA_DIR = 'data/nsi.bg'
                        областта).
 """
 
-def _process_one_year(dir: str, unique_set: set, session: Session) -> list:
+def _process_one_year(dir: str, unique_set: set, lookup: Lookup) -> list:
 
     a_json = None
     table_rows = list()
 
     file_path = path.join(dir, 'ek_obst.json')
     with open(file_path, 'r', encoding='utf-8') as file:
-        a_json = json.load(file)
+        with metrics.phase('parse'):
+            a_json = json.load(file)
 
     if not a_json:
         return table_rows
@@ -44,7 +50,7 @@ def _process_one_year(dir: str, unique_set: set, session: Session) -> list:
 
         m_name = m['name'].lower().capitalize()
         d_abbrev = m_abbrev[:3]
-        d_index = session.query(District.id).filter_by(abbrev=d_abbrev).one()[0]
+        d_index = lookup.district_by_abbrev(d_abbrev)
         new_unit = Municipality(name=m_name,abbrev=m_abbrev, district_id=d_index)
         table_rows.append(new_unit)
 
@@ -53,23 +59,31 @@ def _process_one_year(dir: str, unique_set: set, session: Session) -> list:
 
 def _load(dir_name: str, session: Session):
 
+    lookup = Lookup(session)
     unique_set = set()
     rows = list()
 
     for dir in glob.iglob(f'{dir_name}/*'):
-        one = _process_one_year(dir, unique_set, session)
+        one = _process_one_year(dir, unique_set, lookup)
         rows.extend(one)
 
     return rows
 
+
+def load(session: Session) -> int:
+
+    rows = _load(DATA_DIR, session)
+    session.add_all(rows)
+    return len(rows)
+
+
 if __name__ == "__main__":
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
-        rows = _load(DATA_DIR, session)
-        if not rows:
+        if not load(session):
             sys.exit(0)
-        session.add_all(rows)
         session.commit()
+
         row = session.query(Municipality).filter_by(abbrev='BGS01').first()
-        print(row)
\ No newline at end of file
+        print(row)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# grao.bg
+
+import glob
+import sys
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from database import create_engine
+from models import MonthlyPopulation
+from lookup import Lookup
+from bulk import copy_rows
+from grao import records, t41_records, ROW
+from aliases import Aliases
+import metrics
+
+
+DATA_DIR = 'data/grao.bg'
+
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [f'{DATA_DIR}/t41*']
+TABLES = [MonthlyPopulation]
+
+"""
+  t41ob-*.txt  - по общини: брой населени места, постоянен адрес общо и
+                 по места, настоящ адрес общо и по места
+  t41nm-*.txt  - по населени места: постоянен адрес, настоящ адрес,
+                 постоянен и настоящ адрес в същото населено място
+"""
+
+
+def _process_header(line: str, dist_name, mun_name, report_date, aliases: Aliases) -> tuple:
+
+    if line.startswith('дата'):
+        report_date = date.strptime(line.split()[1], "%d.%m.%Y")
+        dist_name = None
+        mun_name = None
+
+    if line.startswith('област'):
+        line = line.removeprefix('област')
+        dist_name, _, mun_name = line.partition('община')
+        dist_name = aliases.name(dist_name.strip())
+        mun_name = aliases.name(mun_name.strip()) if mun_name else None
+
+    return dist_name, mun_name, report_date
+
+
+def _parse_one_file(file_name: str, aliases: Aliases) -> list:
+    """
+    Parse one t41 report into plain (num, date, district, municipality,
+    settlement, permanent, current) rows. Settlement is None for the rows
+    of the municipality reports.
+    """
+
+    by_settlement = 't41nm' in file_name
+
+    rows = []
+    dist_name = None
+    mun_name = None
+    report_date = None
+    for record in records(t41_records, file_name):
+
+        if record[0] != ROW:
+            dist_name, mun_name, report_date = _process_header(record[2], dist_name, mun_name, report_date, aliases)
+            continue
+
+        _, num, name, numbers = record
+
+        # Totals and the city regions, which are counted in their city
+        if name.startswith('всичко') or name.startswith('в т.ч.'):
+            continue
+
+        if by_settlement:
+            town_name = name.removeprefix('гр.').removeprefix('с.').removeprefix('ман.').strip()
+            town_name = aliases.name(town_name)
+            d_name, m_name = aliases.place(dist_name, mun_name, town_name)
+            permanent, current = numbers[0], numbers[1]
+        else:
+            town_name = None
+            d_name, m_name = aliases.place(dist_name, aliases.name(name), None)
+            permanent, current = numbers[1], numbers[5]
+
+        rows.append((num, report_date, d_name, m_name, town_name, permanent, current))
+
+    return rows
+
+
+def _resolve_one_file(file_name: str, rows: list, lookup: Lookup, missing: set) -> list:
+
+    population = []
+    for num, report_date, dist_name, mun_name, town_name, permanent, current in rows:
+
+        if not report_date:
+            print(f'{file_name}:{num} липсва дата')
+            continue
+
+        m_index = lookup.municipality(dist_name, mun_name)
+        if m_index is None:
+            print(f'{file_name}:{num} Не намирам община {mun_name} в област {dist_name}')
+            continue
+
+        s_index = None
+        if town_name:
+            s_index = lookup.settlement_like(m_index, town_name)
+            if s_index is None:
+                if (m_index, town_name) in missing:
+                    continue
+                missing.add((m_index, town_name))
+                print(f'{file_name}:{num:4} Не намирам селище {town_name} в област {dist_name} в община {mun_name}')
+                continue
+
+        # Same order as bulk.table_columns(MonthlyPopulation)
+        population.append((s_index, m_index, lookup.moment(report_date), permanent, current))
+
+    return population
+
+
+def _load(session: Session) -> list:
+
+    population = []
+    lookup = Lookup(session)
+    aliases = Aliases(session)
+
+    file_names = sorted(glob.iglob(f'{DATA_DIR}/t41*'))
+    with metrics.phase('parse'):
+        parsed = [_parse_one_file(file_name, aliases) for file_name in file_names]
+
+    lookup.insert_moments(row[1] for rows in parsed for row in rows if row[1])
+
+    # Each unknown settlement is reported once, not once per month
+    missing = set()
+    for file_name, rows in zip(file_names, parsed):
+        population.extend(_resolve_one_file(file_name, rows, lookup, missing))
+
+    metrics.rejected(sum(len(rows) for rows in parsed) - len(population))
+
+    return population
+
+
+def load(session: Session) -> int:
+
+    return copy_rows(session, MonthlyPopulation, _load(session))
+
+
+if __name__ == "__main__":
+
+    engine = create_engine(bulk=True)
+
+    with Session(engine) as session:
+
+        if not load(session):
+            sys.exit(0)
+        session.commit()
+
+        rows = session.query(MonthlyPopulation).filter_by(settlement_id=None).limit(5).all()
+        for r in rows:
+            print(r)
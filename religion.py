@@ -1,119 +1,91 @@
 #!/usr/bin/env python3
 
 from os import path
-import csv
 import sys
 from datetime import date
 
-from sqlalchemy import create_engine
+import numpy as np
 from sqlalchemy.orm import Session
 
-from models import Municipality, Moment, Religion
+from database import create_engine
+from models import Municipality, Religion
+from lookup import Lookup
+from bulk import copy_rows
+from infostat import read_table
+import metrics
 
 DATA_DIR = 'data/infostat.nsi.bg'
 
 IN_FILE = 'ВЕРОИЗПОВЕДАНИЕ.csv'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [path.join(DATA_DIR, IN_FILE)]
+TABLES = [Religion]
+
 
 def _load(session: Session):
 
     rows = list()
+    lookup = Lookup(session)
 
-    file_path = path.join(DATA_DIR, IN_FILE)
-    with open(file_path, newline='') as csv_file:
-        spam = csv.reader(csv_file, delimiter=';')
-
-        next(spam)
-        tokens = next(spam)
-        next(spam)
-
-        census_date = date(2021, 1, 1)
-        for t in tokens:
-            if t:
-                census_date = date(int(t), 1, 1)
-                break
-
-        d_index = Moment.insert_date(census_date, session)
+    table = read_table(path.join(DATA_DIR, IN_FILE))
 
-        for row in spam:
-            abbrev_and_name = row[0].split(' ', 1)
+    census_date = date(2021, 1, 1)
+    for year in table.years():
+        if year:
+            census_date = date(year, 1, 1)
+            break
 
-            abbrev = str(abbrev_and_name[0])
-            if len(abbrev) != 5:
-                continue
+    d_index = lookup.moment(census_date)
 
-            name = str(abbrev_and_name[1]).lower().capitalize()
+    # Empty cells count as 0
+    counts = np.nan_to_num(table.values).astype(int)
 
-            municipality = session.query(Municipality).filter_by(abbrev=abbrev).first()
-            if not municipality:
-                print(f'Не намирам община {name} с абреатура {abbrev}')
-                continue
+    for (label, *_), numbers in zip(table.labels, counts):
+        abbrev_and_name = label.split(' ', 1)
 
-            if municipality.name != name:
-                print(f'Името на общината {name} не съвпада {municipality.name}')
-                continue
+        abbrev = str(abbrev_and_name[0])
+        if len(abbrev) != 5:
+            continue
 
-            total = int(row[1])
+        name = str(abbrev_and_name[1]).lower().capitalize()
 
-            try:
-                orthodox = int(row[2])
-            except ValueError:
-                orthodox = 0
+        m_index = lookup.municipality_abbrevs.get(abbrev)
+        if m_index is None:
+            print(f'Не намирам община {name} с абреатура {abbrev}')
+            metrics.rejected()
+            continue
 
-            try:
-                muslims = int(row[3])
-            except ValueError:
-                muslims = 0
+        m_name = lookup.municipality_by_abbrev[abbrev]
+        if m_name != name:
+            print(f'Името на общината {name} не съвпада {m_name}')
+            metrics.rejected()
+            continue
 
-            try:
-                judean = int(row[4])
-            except ValueError:
-                judean = 0
+        (total, orthodox, muslims, judean, other, none, cant_decide,
+         dont_answer, not_shown) = numbers[:9]
 
-            try:
-                other = int(row[5])
-            except ValueError:
-                other = 0
+        new_node = Religion.values(m_index, d_index, total, orthodox,
+                                   muslims, judean, other, none, cant_decide,
+                                   dont_answer, not_shown)
+        rows.append(new_node)
 
-            try:
-                none = int(row[6])
-            except ValueError:
-                none = 0
-
-            try:
-                cant_decide = int(row[7])
-            except ValueError:
-                cant_decide = 0
+    return rows
 
-            try:
-                dont_answer = int(row[8])
-            except ValueError:
-                dont_answer = 0
 
-            try:
-                not_shown = int(row[9])
-            except ValueError:
-                not_shown = 0
+def load(session: Session) -> int:
 
-            new_node = Religion(municipality.id, d_index, total, orthodox,
-                                muslims, judean, other, none, cant_decide,
-                                dont_answer, not_shown)
-            rows.append(new_node)
-
-    return rows
+    return copy_rows(session, Religion, _load(session))
 
 
 if __name__ == "__main__":
 
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
 
-        rows = _load(session)
-        if not rows:
+        if not load(session):
             sys.exit(0)
-
-        session.add_all(rows)
         session.commit()
 
         rows = session.query(Religion).all()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+# Short description of the tables for the prompt of the LLM. The comments
+# in models.py are written for people and are long, here every table gets
+# a line with its first sentence and one with its columns, where '->'
+# marks a join. Label tables get their labels instead. Only the tables
+# which a question is about go into the prompt, with those they join to.
+
+import asyncio
+import hashlib
+import math
+import re
+import sys
+
+from sqlalchemy import String, text
+from vanna.core.middleware import LlmMiddleware
+
+from database import create_engine, DataVersion
+from models import Base
+from views import VIEWS
+
+
+# Tables of the best score per question, before their joins are added
+MAX_TABLES = 4
+
+# Questions of the conversation, the last ones, which select the tables
+QUESTIONS = 2
+
+# Labels shown of a label table, and the characters they take at most
+MAX_LABELS = 40
+LABELS_LENGTH = 300
+
+# Flat copies of fact tables, which answer the questions about them
+# without joins, see facts.py
+FLAT = {'examination': 'school_fact', 'census': 'settlement_year_fact'}
+
+# Short first sentences, like 'Аналитична таблица.', get the next one too
+DESCRIPTION_LENGTH = 160
+SENTENCE_LENGTH = 40
+
+HEADER = 'Database tables for the question. "a -> b.id" joins a to table b:'
+
+_WORD = re.compile(r'\w+')
+
+
+def _stems(line: str) -> set:
+    """ Words of line cut to a length where most Bulgarian endings are gone """
+
+    return {w[:5] for w in _WORD.findall(line.lower()) if len(w) > 2 and not w.isdigit()}
+
+
+def _sentence(comment: str) -> str:
+    """ First sentence of comment on one line """
+
+    sentences = ' '.join((comment or '').split()).split('. ')
+    line = sentences.pop(0)
+    while sentences and len(line) < SENTENCE_LENGTH:
+        line += '. ' + sentences.pop(0)
+    line = line.rstrip('.')
+    if len(line) > DESCRIPTION_LENGTH:
+        line = line[:DESCRIPTION_LENGTH].rsplit(' ', 1)[0] + '...'
+    return line
+
+
+class _Table:
+    """ What the digest knows of a table or view """
+
+    def __init__(self, name: str, comment: str, columns: list, joins: dict, label: str = None):
+        self.name = name
+        self.description = _sentence(comment)
+        self.columns = columns
+        self.joins = joins
+        self.label = label
+        self.title = _stems(f'{name.replace("_", " ")} {self.description}')
+        self.words = set()
+
+    def render(self, labels: list = None) -> str:
+        if labels is not None:
+            values = '; '.join(str(v) for v in labels)
+            if len(values) > LABELS_LENGTH:
+                values = values[:LABELS_LENGTH].rsplit('; ', 1)[0] + '; ...'
+            columns = f'id, {self.label}: {values}'
+        else:
+            columns = ', '.join(f'{c} -> {self.joins[c]}' if c in self.joins else c for c in self.columns)
+        return f'{self.name}: {self.description}\n  {columns}'
+
+
+def _tables() -> dict:
+
+    tables = {}
+    for table in Base.metadata.sorted_tables:
+        if (table.comment or '').strip().startswith('Служебна таблица'):
+            continue
+
+        joins = {}
+        for column in table.columns:
+            for key in column.foreign_keys:
+                joins[column.name] = key.target_fullname
+
+        # id and a single string, like settlement_type and examination_subject
+        label = None
+        strings = [c for c in table.columns if not c.primary_key and isinstance(c.type, String)]
+        if len(table.columns) == 2 and len(strings) == 1:
+            label = strings[0].name
+
+        entry = _Table(table.name, table.comment, [c.name for c in table.columns], joins, label)
+        words = [table.name.replace('_', ' '), table.comment or '']
+        for column in table.columns:
+            words += [column.name.replace('_', ' '), column.comment or '']
+        entry.words = _stems(' '.join(words)) | entry.title
+        tables[table.name] = entry
+
+    for name, (comment, _, query) in VIEWS.items():
+        columns = [c.name for c in query().selected_columns]
+        joins = {c: f'{c.removesuffix("_id")}.id' for c in columns
+                 if c.endswith('_id') and c.removesuffix('_id') in tables}
+        joins.update({c: 'moment.id' for c in columns if c == 'date_id'})
+        entry = _Table(name, comment, columns, joins)
+        entry.words = _stems(' '.join([comment] + [c.replace('_', ' ') for c in columns])) | entry.title
+        tables[name] = entry
+
+    return tables
+
+
+class SchemaDigest(LlmMiddleware):
+    """
+    Adds the digest of the tables relevant to the last question to the
+    system prompt. version changes with models.py and views.py, the
+    labels are read again when the data version changes.
+    """
+
+    def __init__(self, engine, version: DataVersion):
+        self.engine = engine
+        self.data_version = version
+        self.tables = _tables()
+        self.version = hashlib.sha256('\n'.join(t.render() for t in self.tables.values()).encode('utf-8')) \
+            .hexdigest()[:16]
+
+        # Rare words tell more about the question than words of every table
+        counts = {}
+        for table in self.tables.values():
+            for word in table.words:
+                counts[word] = counts.get(word, 0) + 1
+        self.weights = {word: math.log(len(self.tables) / n) for word, n in counts.items()}
+
+        self.lock = asyncio.Lock()
+        self.labels = {}
+        self.labels_version = None
+
+    def _read_labels(self) -> dict:
+
+        labels = {}
+        with self.engine.connect() as conn:
+            for table in self.tables.values():
+                if table.label:
+                    values = conn.scalars(text(f'SELECT {table.label} FROM {table.name} ORDER BY id')).all()
+                    labels[table.name] = list(dict.fromkeys(values))[:MAX_LABELS]
+        return labels
+
+    async def _labels(self) -> dict:
+
+        # One request reads the labels in a worker thread, the others wait for them
+        async with self.lock:
+            version = await self.data_version.get()
+            if version != self.labels_version:
+                self.labels = await asyncio.to_thread(self._read_labels)
+                self.labels_version = version
+            return self.labels
+
+    def select(self, question: str) -> list:
+        """
+        Names of the tables for question, with the FLAT copies of them and
+        every table they join to, directly or through another one. The
+        label tables and moment when none matches. A word of the name or
+        the description of a table counts twice.
+        """
+
+        words = _stems(question)
+        scores = {name: sum(self.weights.get(w, 0) * (2 if w in table.title else 1)
+                            for w in words & table.words)
+                  for name, table in self.tables.items()}
+        best = sorted((s, n) for n, s in scores.items() if s > 0)[::-1][:MAX_TABLES]
+        if not best:
+            return [name for name, table in self.tables.items() if table.label] + ['moment']
+
+        names = []
+        for _, name in best:
+            names += [n for n in (name, FLAT.get(name)) if n in self.tables and n not in names]
+
+        # names grows while it is walked
+        for name in names:
+            for target in self.tables[name].joins.values():
+                target = target.split('.')[0]
+                if target not in names:
+                    names.append(target)
+
+        return names
+
+    async def digest(self, question: str) -> str:
+
+        labels = await self._labels()
+        lines = [f'{HEADER} ({self.version})']
+        lines += [self.tables[name].render(labels.get(name)) for name in self.select(question)]
+        return '\n'.join(lines)
+
+    async def before_llm_request(self, request):
+
+        # A question like 'Коя е най-малката от тях?' is about the one before
+        questions = [m.content for m in request.messages if m.role == 'user' and m.content]
+        if questions:
+            digest = await self.digest(' '.join(questions[-QUESTIONS:]))
+            request.system_prompt = f'{request.system_prompt}\n\n{digest}' if request.system_prompt else digest
+        return request
+
+
+if __name__ == "__main__":
+
+    engine = create_engine()
+    schema = SchemaDigest(engine, DataVersion(engine))
+    print(asyncio.run(schema.digest(' '.join(sys.argv[1:]))))
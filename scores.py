@@ -5,13 +5,15 @@ import sys
 from os import path
 from datetime import date
 
-from sqlalchemy import create_engine
+import numpy as np
 from sqlalchemy.orm import Session
 
+from database import create_engine
 from models import Examination
-from models import ExaminationSubject
-from models import Institution
-from models import Moment
+from lookup import Lookup
+from bulk import copy_rows
+import cache
+import metrics
 
 
 # https://nvoresults.com/matura_results.json
@@ -23,129 +25,184 @@ DATA_DIR = 'data/nvoresults.com'
 INTERNAL = 'matura_results.json'
 EXTERNAL = 'results.json'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [path.join(DATA_DIR, INTERNAL), path.join(DATA_DIR, EXTERNAL)]
+TABLES = [Examination]
 
-def _process_internal_results(session: Session) -> list:
 
-    rows = []
+def _internal_date(date_str: str) -> date:
+    tokens = date_str.replace('.', '_').split('_')
+    return date(int(tokens[0]), int(tokens[1]), 1)
+
+
+def _external_date(date_str: str) -> date:
+    tokens = date_str.split('_')
+    return date(2000 + int(tokens[2]), 5, 1)
+
+
+def _internal_columns(file_name: str) -> dict:
+    """ One row per school, date and subject of matura_results.json """
+
+    school, date_str, subject, score, students = [], [], [], [], []
 
-    file_name = path.join(DATA_DIR, INTERNAL)
     with open(file_name, 'r', encoding='utf-8') as file:
         results = json.load(file)['results']
 
-        for school_id in results:
+    for school_id in results:
+        for d_str in results[school_id]:
+            for subj_str in results[school_id][d_str]:
+                school.append(str(school_id))
+                date_str.append(d_str)
+                subject.append(subj_str)
+                score.append(results[school_id][d_str][subj_str]['score'])
+                students.append(results[school_id][d_str][subj_str]['numberOfStudents'])
+
+    return {'school': school, 'date': date_str, 'subject': subject,
+            'score': np.array(score, dtype=np.float64),
+            'students': np.array(students, dtype=np.int64)}
 
-            i_code = str(school_id)
-            i_index = session.query(Institution.id).filter_by(code=i_code).first()
-            if not i_index:
-                print(f'Невалиден код на училище: {i_code}')
-                continue
 
-            for date_str in results[school_id]:
+def _external_columns(file_name: str) -> dict:
+    """ One row per school and date of results.json, NaN for missing numbers """
 
-                tokens = date_str.replace('.', '_').split('_')
-                exam_date = date(int(tokens[0]), int(tokens[1]), 1)
+    columns = {'school': [], 'name': [], 'city': [], 'date': []}
+    numbers = {'grade': [], 'bel_score': [], 'bel_students': [], 'math_score': [], 'math_students': []}
+
+    with open(file_name, 'r', encoding='utf-8') as file:
+        results = json.load(file)
+
+    for school_code in results:
+        for date_str, exam in results[school_code]['exam_results'].items():
+            columns['school'].append(str(school_code))
+            columns['name'].append(results[school_code]['name'])
+            columns['city'].append(results[school_code]['city'])
+            columns['date'].append(date_str)
+            for key, values in numbers.items():
+                values.append(np.nan if exam[key] is None else float(exam[key]))
+
+    columns.update((key, np.array(values, dtype=np.float64)) for key, values in numbers.items())
+    return columns
 
-                d_index = Moment.insert_date(exam_date, session)
-                if not d_index:
-                    continue
 
-                for subj_str in results[school_id][date_str]:
-                    subj_code = session.query(ExaminationSubject.id).filter_by(
-                        subject=subj_str).first()
-                    if not subj_code:
-                        print(f'Невалиден код на тема "{subj_str}" в училище "{school_id}"')
-                        continue
+def _number(value: float, kind=float):
+    return None if np.isnan(value) else kind(value)
 
-                    score = results[school_id][date_str][subj_str]['score']
-                    students = results[school_id][date_str][subj_str]['numberOfStudents']
 
-                    exam = Examination(institution_id=i_index[0],
-                                       date_id=d_index, grade=12,
-                                       subject_id=subj_code[0], score=score,
-                                       students=students)
+def _process_internal_results(lookup: Lookup) -> list:
+
+    rows = []
+
+    file_name = path.join(DATA_DIR, INTERNAL)
+    results = cache.columns(file_name, _internal_columns, __file__)
+
+    lookup.insert_moments(_internal_date(date_str) for date_str in dict.fromkeys(results['date']))
+
+    reported = set()
+    for school_id, date_str, subj_str, score, students in zip(
+            results['school'], results['date'], results['subject'],
+            results['score'].tolist(), results['students'].tolist()):
+
+        i_code = school_id
+        i_index = lookup.institution(i_code)
+        if i_index is None:
+            if i_code not in reported:
+                reported.add(i_code)
+                print(f'Невалиден код на училище: {i_code}')
+            metrics.rejected()
+            continue
+
+        d_index = lookup.moment(_internal_date(date_str))
+        if d_index is None:
+            metrics.rejected()
+            continue
+
+        subj_code = lookup.subject(subj_str)
+        if subj_code is None:
+            print(f'Невалиден код на тема "{subj_str}" в училище "{school_id}"')
+            metrics.rejected()
+            continue
+
+        exam = (i_index, d_index, 12, score, students, subj_code)
+
+        rows.append(exam)
 
-                    rows.append(exam)
     return rows
 
 
-def _process_external_results(session: Session) -> list:
+def _process_external_results(lookup: Lookup) -> list:
 
     rows = []
 
-    math_code = session.query(ExaminationSubject.id).filter_by(subject='Математика').first()[0]
-    lang_code = session.query(ExaminationSubject.id).filter_by(subject='Български език и литература').first()[0]
+    math_code = lookup.subject('Математика')
+    lang_code = lookup.subject('Български език и литература')
 
     file_name = path.join(DATA_DIR, EXTERNAL)
-    with open(file_name, 'r', encoding='utf-8') as file:
-        results = json.load(file)
-
-        for res in results:
+    results = cache.columns(file_name, _external_columns, __file__)
 
-            school_code = str(res)
-            school_name = results[school_code]['name']
-            city_name = results[school_code]['city']
+    lookup.insert_moments(_external_date(date_str) for date_str in dict.fromkeys(results['date']))
 
-            i_index = session.query(Institution.id).filter_by(
-                code=school_code).first()
-            if not i_index:
-                print(f'Невалиден код на училище "{school_code}" "{school_name}" "{city_name}"')
-                continue
+    reported = set()
+    for i in range(len(results['school'])):
 
-            for date_str in results[school_code]['exam_results']:
+        school_code = results['school'][i]
+        school_name = results['name'][i]
+        city_name = results['city'][i]
 
-                tokens = date_str.split('_')
-                exam_date = date(2000 + int(tokens[2]), 5, 1)
+        i_index = lookup.institution(school_code)
+        if i_index is None:
+            if school_code not in reported:
+                reported.add(school_code)
+                print(f'Невалиден код на училище "{school_code}" "{school_name}" "{city_name}"')
+            metrics.rejected()
+            continue
 
-                d_index = Moment.insert_date(exam_date, session)
-                if not d_index:
-                    continue
+        d_index = lookup.moment(_external_date(results['date'][i]))
+        if d_index is None:
+            metrics.rejected()
+            continue
 
-                grade = int(results[school_code]
-                            ['exam_results'][date_str]['grade'])
+        grade = _number(results['grade'][i], int)
 
-                score = results[school_code]['exam_results'][date_str]['bel_score']
-                students = results[school_code]['exam_results'][date_str]['bel_students']
+        score = _number(results['bel_score'][i])
+        students = _number(results['bel_students'][i], int)
 
-                exam = Examination(institution_id=i_index[0],
-                                   date_id=d_index, grade=grade,
-                                   subject_id=lang_code, score=score,
-                                   students=students)
+        exam = (i_index, d_index, grade, score, students, lang_code)
 
-                rows.append(exam)
+        rows.append(exam)
 
-                score = results[school_code]['exam_results'][date_str]['math_score']
-                students = results[school_code]['exam_results'][date_str]['math_students']
+        score = _number(results['math_score'][i])
+        students = _number(results['math_students'][i], int)
 
-                exam = Examination(institution_id=i_index[0],
-                                   date_id=d_index, grade=grade,
-                                   subject_id=math_code, score=score,
-                                   students=students)
+        exam = (i_index, d_index, grade, score, students, math_code)
 
-                rows.append(exam)
+        rows.append(exam)
 
     return rows
 
 
 def _load(session: Session) -> list:
 
-    external = _process_external_results(session)
-    internal = _process_internal_results(session)
+    lookup = Lookup(session)
+    external = _process_external_results(lookup)
+    internal = _process_internal_results(lookup)
     internal.extend(external)
 
     return internal
 
 
+def load(session: Session) -> int:
+
+    return copy_rows(session, Examination, _load(session))
+
+
 if __name__ == "__main__":
 
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
 
-        rows = _load(session)
-        if not rows:
+        if not load(session):
             sys.exit(0)
-
-        session.add_all(rows)
         session.commit()
 
         rows = session.query(Examination).filter_by(institution_id=512).all()
@@ -0,0 +1,163 @@
+# Answers of the Vanna agent kept for questions which are asked again.
+# A question seen before gets the SQL which answered it, without the LLM,
+# and a query run before gets its rows, without the database. Both are
+# keyed by the version of the data and forgotten when a build changes it.
+
+import asyncio
+import re
+import uuid
+
+import pandas as pd
+import sqlparse
+from cachetools import TTLCache
+from vanna.capabilities.sql_runner import SqlRunner, RunSqlToolArgs
+from vanna.core.lifecycle import LifecycleHook
+from vanna.core.storage import Message
+from vanna.core.tool import ToolContext
+from vanna.core.workflow import DefaultWorkflowHandler, WorkflowResult
+
+from database import DataVersion
+
+
+# Question -> SQL, what the LLM answered is good until the next build
+QUESTION_ITEMS = 1000
+QUESTION_SECONDS = 24 * 3600
+
+# SQL -> rows, larger results are read again every time
+RESULT_ITEMS = 200
+RESULT_SECONDS = 600
+RESULT_ROWS = 10000
+
+_WORD = re.compile(r'\w+')
+
+
+def question_key(question: str) -> str:
+    """ The words of question in lower case, without punctuation """
+
+    return ' '.join(_WORD.findall(question.lower()))
+
+
+def sql_key(sql: str) -> str:
+    """ sql without comments, extra white space and the final semicolon """
+
+    return sqlparse.format(sql, strip_comments=True, strip_whitespace=True).rstrip('; ')
+
+
+def _is_select(sql: str) -> bool:
+    words = sql.split(None, 1)
+    return bool(words) and words[0].upper() == 'SELECT'
+
+
+class _VersionedCache:
+    """ LRU cache with expiry, emptied when the data version changes """
+
+    def __init__(self, items: int, seconds: float, version: DataVersion):
+        self.cache = TTLCache(maxsize=items, ttl=seconds)
+        self.version = version
+        self.current = None
+        self.lock = asyncio.Lock()
+
+    async def _check(self) -> None:
+        version = await self.version.get()
+        if version != self.current:
+            self.cache.clear()
+            self.current = version
+
+    async def get(self, key):
+        async with self.lock:
+            await self._check()
+            return self.cache.get(key)
+
+    async def set(self, key, value) -> None:
+        async with self.lock:
+            await self._check()
+            self.cache[key] = value
+
+    async def pop(self, key) -> None:
+        async with self.lock:
+            self.cache.pop(key, None)
+
+
+class CachedRunner(SqlRunner):
+    """
+    Keeps the rows of the SELECT queries of runner. Remembers the last
+    query of every conversation, unless it failed, for QuestionCache.
+    """
+
+    def __init__(self, runner: SqlRunner, version: DataVersion):
+        self.runner = runner
+        self.results = _VersionedCache(RESULT_ITEMS, RESULT_SECONDS, version)
+        self.last = TTLCache(maxsize=QUESTION_ITEMS, ttl=RESULT_SECONDS)
+
+    async def run_sql(self, args: RunSqlToolArgs, context: ToolContext) -> pd.DataFrame:
+
+        key = sql_key(args.sql)
+        if not _is_select(key):
+            return await self.runner.run_sql(args, context)
+
+        df = await self.results.get(key)
+        if df is None:
+            try:
+                df = await self.runner.run_sql(args, context)
+            except Exception:
+                # A query which failed answers nothing, neither does the one before it
+                self.last.pop(context.conversation_id, None)
+                raise
+            if len(df) <= RESULT_ROWS:
+                await self.results.set(key, df)
+
+        self.last[context.conversation_id] = key
+        return df.copy()
+
+
+class QuestionCache(DefaultWorkflowHandler, LifecycleHook):
+    """
+    Answers the first question of a conversation with the SQL which
+    answered the same question before, without asking the LLM. Later
+    questions of a conversation depend on the earlier ones, they are
+    neither answered nor remembered.
+    """
+
+    def __init__(self, tool, runner: CachedRunner, version: DataVersion):
+        super().__init__()
+        self.tool = tool
+        self.runner = runner
+        self.questions = _VersionedCache(QUESTION_ITEMS, QUESTION_SECONDS, version)
+
+    async def try_handle(self, agent, user, conversation, message: str) -> WorkflowResult:
+
+        result = await super().try_handle(agent, user, conversation, message)
+        if result.should_skip_llm or conversation.messages:
+            return result
+
+        key = question_key(message)
+        sql = await self.questions.get(key)
+        if sql is None:
+            return result
+
+        context = ToolContext(user=user, conversation_id=conversation.id, request_id=str(uuid.uuid4()),
+                              agent_memory=agent.agent_memory)
+        answer = await self.tool.execute(context, RunSqlToolArgs(sql=sql))
+        if not answer.success:
+            await self.questions.pop(key)
+            return result
+
+        async def _remember(conversation):
+            conversation.add_message(Message(role='user', content=message))
+            conversation.add_message(Message(role='assistant', content=f'{sql}\n\n{answer.result_for_llm}'))
+
+        return WorkflowResult(should_skip_llm=True, components=[answer.ui_component],
+                              conversation_mutation=_remember)
+
+    async def after_message(self, conversation) -> None:
+
+        sql = self.runner.last.pop(conversation.id, None)
+        questions = [m for m in conversation.messages if m.role == 'user']
+        if sql is None or len(questions) != 1:
+            return
+
+        # Only the last query of the turn answers the question, not one
+        # which only looked at the data before it
+        calls = [call for m in conversation.messages for call in m.tool_calls or [] if call.name == self.tool.name]
+        if calls and sql_key(calls[-1].arguments.get('sql', '')) == sql:
+            await self.questions.set(question_key(questions[0].content), sql)
@@ -0,0 +1,95 @@
+# Limits on the queries which the LLM writes. A query runs in a read only
+# transaction, with a time limit and a limit on the rows it returns, and
+# only when the planner expects it to be cheap enough. The rows are read
+# from a server side cursor a page at a time, a query with more rows than
+# the limit is rejected rather than cut short.
+
+import json
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from vanna.capabilities.sql_runner import SqlRunner, RunSqlToolArgs
+from vanna.core.tool import ToolContext
+
+from sqlcache import sql_key
+
+
+# Planner cost of the query with its LIMIT, a count of statistic is about 15000
+MAX_COST = 1000000
+
+# Milliseconds a query may run
+STATEMENT_TIMEOUT = 30000
+
+# Rows returned per query, and read from the cursor at a time
+MAX_ROWS = 1000
+PAGE_ROWS = 200
+
+
+class QueryRejected(Exception):
+    """ The query was not run, or was stopped, the message tells why """
+
+
+def limited(sql: str, rows: int = MAX_ROWS) -> str:
+    """ sql returning at most rows rows, the planner takes the limit into account """
+
+    # A comment before SELECT is not a reason to reject the query
+    sql = sql_key(sql)
+    words = sql.split(None, 1)
+    if not words or words[0].upper() not in ('SELECT', 'WITH'):
+        raise QueryRejected('Позволени са само заявки SELECT')
+
+    return f'SELECT * FROM (\n{sql}\n) AS q LIMIT {rows}'
+
+
+class GuardedRunner(SqlRunner):
+    """ Runs the queries on engine within MAX_COST, STATEMENT_TIMEOUT and MAX_ROWS """
+
+    def __init__(self, engine, max_cost: float = MAX_COST, timeout: int = STATEMENT_TIMEOUT,
+                 max_rows: int = MAX_ROWS):
+        self.engine = engine
+        self.max_cost = max_cost
+        self.timeout = timeout
+        self.max_rows = max_rows
+
+    def _cost(self, conn, sql: str) -> float:
+        plan = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {sql}').scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Total Cost']
+
+    def guarded(self, conn, sql: str) -> pd.DataFrame:
+        """ Rows of sql on conn, in its transaction """
+
+        # One row more tells that there are more than max_rows
+        sql = limited(sql, self.max_rows + 1)
+
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text('SET TRANSACTION READ ONLY'))
+            conn.execute(text(f'SET LOCAL statement_timeout = {int(self.timeout)}'))
+
+            cost = self._cost(conn, sql)
+            if cost > self.max_cost:
+                raise QueryRejected(f'Заявката е твърде тежка: цена {cost:.0f} при граница {self.max_cost:.0f}. '
+                                    f'Добави условия в WHERE или обобщи с GROUP BY.')
+
+        try:
+            result = conn.execution_options(stream_results=True, max_row_buffer=PAGE_ROWS).exec_driver_sql(sql)
+            rows = []
+            for page in result.partitions(PAGE_ROWS):
+                rows += page
+            if len(rows) > self.max_rows:
+                raise QueryRejected(f'Заявката връща повече от {self.max_rows} реда. '
+                                    f'Обобщи с GROUP BY или добави LIMIT {self.max_rows}.')
+            return pd.DataFrame(rows, columns=list(result.keys()))
+        except OperationalError as e:
+            if 'statement timeout' in str(e):
+                raise QueryRejected(f'Заявката е прекъсната след {self.timeout / 1000:.0f} секунди') from e
+            raise
+
+    def run(self, sql: str) -> pd.DataFrame:
+        with self.engine.begin() as conn:
+            return self.guarded(conn, sql)
+
+    async def run_sql(self, args: RunSqlToolArgs, context: ToolContext) -> pd.DataFrame:
+        return self.run(args.sql)
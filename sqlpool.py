@@ -0,0 +1,64 @@
+# Queries of many Vanna users at once. They wait for a connection of a
+# bounded asyncio pool instead of blocking the event loop, and every user
+# runs only a few at a time. When a client goes away the task of its
+# request is cancelled, and psycopg cancels the query on the server.
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pandas as pd
+from vanna.capabilities.sql_runner import RunSqlToolArgs
+from vanna.core.tool import ToolContext
+
+from database import create_async_engine
+from sqlguard import GuardedRunner
+
+
+# Queries of one user which run at the same time, the others wait
+USER_QUERIES = 2
+
+
+class AsyncRunner(GuardedRunner):
+    """
+    GuardedRunner on the asyncio engine of database.create_async_engine().
+    Databases without one, like a SQLite snapshot, run on engine in a
+    worker thread.
+    """
+
+    def __init__(self, engine, user_queries: int = USER_QUERIES, **kwargs):
+        super().__init__(engine, **kwargs)
+        self.async_engine = create_async_engine(engine.url)
+        self.user_queries = user_queries
+        self.users = {}
+
+    @asynccontextmanager
+    async def _user(self, user_id: str):
+
+        # [semaphore, queries running or waiting], forgotten when the user is idle
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = [asyncio.Semaphore(self.user_queries), 0]
+
+        user[1] += 1
+        try:
+            async with user[0]:
+                yield
+        finally:
+            user[1] -= 1
+            if user[1] == 0:
+                del self.users[user_id]
+
+    async def run_sql(self, args: RunSqlToolArgs, context: ToolContext) -> pd.DataFrame:
+
+        async with self._user(context.user.id):
+            if self.async_engine is None:
+                return await asyncio.to_thread(self.run, args.sql)
+
+            async with self.async_engine.begin() as conn:
+                return await conn.run_sync(self.guarded, args.sql)
+
+    async def close(self) -> None:
+        """ Close the connections of the asyncio engine, on the loop which opened them """
+
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
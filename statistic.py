@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+# infostat.nsi.bg
+
+import sys
+from os import path
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from database import create_engine
+from models import Statistic
+from lookup import Lookup
+from bulk import copy_rows
+from infostat import read_table
+
+
+DATA_DIR = 'data/infostat.nsi.bg'
+
+# Tables without a loader of their own
+IN_FILES = [
+    'БРОЙ ВЪЗНИКНАЛИ СЪБИТИЯ.csv',
+    'ГЪСТОТА НА НАСЕЛЕНИЕТО.csv',
+    'ДЕМОГРАФИЯ ОБЛАСТИТЕ.csv',
+    'ИКОНОМИЧЕСКА АКТИВНОСТ.csv',
+    'НАСЕЛЕНИЕ ВЪЗРАСТ.csv',
+    'ОСТАТЪЧЕН КАПАЦИТЕТ НА ДЕПАТА.csv',
+    'РАБОТНА СИЛА 15+.csv',
+    'САМООЦЕНКА НА ЗДРАВЕТО.csv',
+    'ТЕЛК 16+.csv',
+    'ТИП на ТЕРИТОРИЯТА.csv',
+]
+
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [path.join(DATA_DIR, f) for f in IN_FILES]
+TABLES = [Statistic]
+
+
+class _Territories:
+    """
+    Resolve the territory labels of one table, in table order, to
+    (district id, municipality id, settlement id).
+
+    Labels are either prefixed with a code, 'VID', 'VID09 Видин' or
+    '10971 гр. Видин', or only a name. Names are ambiguous, 'Видин' is
+    both a district and a municipality, so they are resolved against the
+    municipalities of the last seen district first. Repeated labels on
+    consecutive rows belong to the same territory.
+    """
+
+    def __init__(self, lookup: Lookup):
+        self.lookup = lookup
+        self.m_district = {m_id: d_id for (d_id, _), m_id in lookup.municipalities.items()}
+        self.s_municipality = {s_id: m_id for (m_id, _), s_id in lookup.settlements.items()}
+        self.district = None
+        self.label = None
+        self.result = (None, None, None)
+
+    def resolve(self, label: str) -> tuple:
+
+        if label != self.label:
+            self.label = label
+            self.result = self._resolve(label)
+            if self.result[0] is not None:
+                self.district = self.result[0]
+
+        return self.result
+
+    def _resolve(self, label: str) -> tuple:
+
+        lookup = self.lookup
+        code, _, name = label.partition(' ')
+
+        if len(code) == 5 and code.isdigit():
+            s_index = int(code)
+            if s_index in lookup.settlement_ids:
+                m_index = self.s_municipality.get(s_index)
+                return self.m_district.get(m_index), m_index, s_index
+            print(f'Не намирам селище {label}')
+            return None, None, None
+
+        d_index = lookup.district_by_abbrev(code)
+        if d_index is not None:
+            return d_index, None, None
+
+        m_index = lookup.municipality_abbrevs.get(code)
+        if m_index is not None:
+            return self.m_district.get(m_index), m_index, None
+
+        name = label.lower().capitalize()
+
+        m_index = lookup.municipalities.get((self.district, name))
+        if m_index is not None:
+            return self.district, m_index, None
+
+        d_index = lookup.district(name)
+        if d_index is not None:
+            return d_index, None, None
+
+        return None, None, None
+
+
+def _process_one_table(file_name: str, lookup: Lookup) -> list:
+
+    table = read_table(path.join(DATA_DIR, file_name))
+    source = file_name.removesuffix('.csv')
+
+    years = table.years()
+    lookup.insert_moments(date(year, 1, 1) for year in years if year)
+    date_indexes = [lookup.moment(date(year, 1, 1)) if year else None for year in years]
+
+    territories = _Territories(lookup)
+    places = [territories.resolve(label[0]) for label in table.labels]
+
+    # Indicator and unit labels of the row, then the column headings
+    row_parts = [list(label[1:]) for label in table.labels]
+    col_parts = table.categories()
+
+    rows = []
+    for r, c, value in zip(*table.melt()):
+        indicator = ' / '.join(p for p in row_parts[r] + [col_parts[c]] if p)
+        # Same order as bulk.table_columns(Statistic)
+        rows.append((source, table.labels[r][0], *places[r], date_indexes[c],
+                     indicator, float(value)))
+
+    return rows
+
+
+def _load(session: Session) -> list:
+
+    rows = []
+    lookup = Lookup(session)
+
+    for file_name in IN_FILES:
+        rows.extend(_process_one_table(file_name, lookup))
+
+    return rows
+
+
+def load(session: Session) -> int:
+
+    return copy_rows(session, Statistic, _load(session))
+
+
+if __name__ == "__main__":
+
+    engine = create_engine(bulk=True)
+
+    with Session(engine) as session:
+
+        if not load(session):
+            sys.exit(0)
+        session.commit()
+
+        rows = session.query(Statistic).filter(Statistic.settlement_id.isnot(None)).limit(5).all()
+        for r in rows:
+            print(r)
@@ -4,14 +4,19 @@ import json
 from os import path
 import sys
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
+from database import create_engine
 from models import ExaminationSubject
+import metrics
 
 DATA_DIR = 'data/nvoresults.com'
 INTERNAL = 'matura_results.json'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [path.join(DATA_DIR, INTERNAL)]
+TABLES = [ExaminationSubject]
+
 
 def _load():
 
@@ -21,7 +26,8 @@ def _load():
     table_rows = set()
 
     with open(file_path, 'r', encoding='utf-8') as file:
-        results = json.load(file)['results']
+        with metrics.phase('parse'):
+            results = json.load(file)['results']
         for school_str in results:
             for date_str in results[school_str]:
                 for subject in results[school_str][date_str]:
@@ -36,16 +42,20 @@ def _load():
     return table_rows
 
 
+def load(session: Session) -> int:
+
+    rows = _load()
+    session.add_all(rows)
+    return len(rows)
+
 
 if __name__ == "__main__":
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
-        rows = _load()
-        if not rows:
+        if not load(session):
             sys.exit(0)
-        session.add_all(rows)
         session.commit()
 
         e = session.query(ExaminationSubject).filter_by(subject='Математика').first()
-        print(e)
\ No newline at end of file
+        print(e)
@@ -4,15 +4,20 @@ import json
 from os import path
 import sys
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
+from database import create_engine
 from models import InstitutionStatus
+import metrics
 
 DATA_DIR = 'data/mon.bg'
 
 IN_FILE = 'transformType.json'
 
+# Input files and the tables filled from them, see infobg.py
+SOURCES = [path.join(DATA_DIR, IN_FILE)]
+TABLES = [InstitutionStatus]
+
 # https://nvoresults.com/matura_schools.json
 
 
@@ -21,7 +26,8 @@ def _load():
     file_path = path.join(DATA_DIR, IN_FILE)
     with open(file_path, 'r', encoding='UTF-8') as file:
 
-        finance_types = json.load(file)['data']
+        with metrics.phase('parse'):
+            finance_types = json.load(file)['data']
 
         unique_filter = set()
         table_rows = list()
@@ -52,16 +58,20 @@ def guess_institution_status(school_name: str) -> int:
     return 3    # действаща
 
 
+def load(session: Session) -> int:
+
+    rows = _load()
+    session.add_all(rows)
+    return len(rows)
+
+
 if __name__ == "__main__":
-    engine = create_engine("postgresql://localhost/infobg")
+    engine = create_engine(bulk=True)
 
     with Session(engine) as session:
-        rows = _load()
-        if not rows:
+        if not load(session):
             sys.exit(0)
-
-        session.add_all(rows)
         session.commit()
 
         e = session.query(InstitutionStatus).filter_by(id=3).first()
-        print(e)
\ No newline at end of file
+        print(e)
@@ -8,8 +8,12 @@ from vanna.tools import RunSqlTool, VisualizeDataTool
 from vanna.tools.agent_memory import SaveQuestionToolArgsTool, SearchSavedCorrectToolUsesTool, SaveTextMemoryTool
 from vanna.servers.fastapi import VannaFastAPIServer
 from vanna.integrations.ollama import OllamaLlmService
-from vanna.integrations.postgres import PostgresRunner
-from vanna.integrations.local.agent_memory import DemoAgentMemory
+
+from database import create_engine, DataVersion
+from sqlcache import CachedRunner, QuestionCache
+from sqlpool import AsyncRunner
+from schema import SchemaDigest
+from memory import VectorAgentMemory
 
 # Configure your LLM
 llm = OllamaLlmService(
@@ -18,12 +22,22 @@ llm = OllamaLlmService(
 )
 
 # Configure your database
+engine = create_engine()
+version = DataVersion(engine)
+async_runner = AsyncRunner(engine)
+sql_runner = CachedRunner(async_runner, version)
 db_tool = RunSqlTool(
-    sql_runner=PostgresRunner(connection_string="postgresql://localhost/infobg")
+    sql_runner=sql_runner
 )
 
+# Answer the questions asked before without the LLM
+question_cache = QuestionCache(db_tool, sql_runner, version)
+
+# Describe the tables of each question in the system prompt
+schema_digest = SchemaDigest(engine, version)
+
 # Configure your agent memory
-agent_memory = DemoAgentMemory(max_items=1000)
+agent_memory = VectorAgentMemory()
 
 # Configure user authentication
 class SimpleUserResolver(UserResolver):
@@ -55,9 +69,20 @@ agent = Agent(
     tool_registry=tools,
     user_resolver=user_resolver,
     agent_memory=agent_memory,
+    workflow_handler=question_cache,
+    lifecycle_hooks=[question_cache],
+    llm_middlewares=[schema_digest],
     config=config
 )
 
+# Close the connections of the queries when the server stops
+class Server(VannaFastAPIServer):
+    def create_app(self):
+        app = super().create_app()
+        app.router.on_shutdown.append(async_runner.close)
+        return app
+
 # Run the server
-server = VannaFastAPIServer(agent)
-server.run()  # Access at http://localhost:8000
\ No newline at end of file
+server = Server(agent)
+server.run()  # Access at http://localhost:8000
+agent_memory.close()
\ No newline at end of file
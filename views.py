@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Materialized views with the aggregates asked for most often. SQLite
+# has no materialized views, there they are plain tables filled again
+# by every refresh().
+
+from sqlalchemy import text, select, union, func, extract, cast, Integer
+
+from database import create_engine
+from models import Municipality, Census, Examination, Moment
+from models import Ethnicity, MotherTongue, Religion
+
+
+def _year(column):
+    return cast(extract('year', column), Integer).label('year')
+
+
+def _municipality_population():
+
+    return select(Census.municipality_id, Municipality.district_id, Census.date_id,
+                  _year(Moment.date),
+                  func.sum(Census.permanent).label('permanent'),
+                  func.sum(Census.current).label('current')) \
+        .join(Municipality, Municipality.id == Census.municipality_id) \
+        .join(Moment, Moment.id == Census.date_id) \
+        .group_by(Census.municipality_id, Municipality.district_id, Census.date_id, Moment.date)
+
+
+def _district_population():
+
+    return select(Municipality.district_id, Census.date_id,
+                  _year(Moment.date),
+                  func.sum(Census.permanent).label('permanent'),
+                  func.sum(Census.current).label('current')) \
+        .join(Municipality, Municipality.id == Census.municipality_id) \
+        .join(Moment, Moment.id == Census.date_id) \
+        .group_by(Municipality.district_id, Census.date_id, Moment.date)
+
+
+def _examination_average():
+
+    year = _year(Moment.date)
+    return select(Examination.institution_id, Examination.subject_id, Examination.grade, year,
+                  func.sum(Examination.students).label('students'),
+                  (func.sum(Examination.score * Examination.students) /
+                   func.nullif(func.sum(Examination.students), 0)).label('score')) \
+        .join(Moment, Moment.id == Examination.date_id) \
+        .group_by(Examination.institution_id, Examination.subject_id, Examination.grade,
+                  year.element)
+
+
+def _municipality_demography():
+
+    keys = union(select(Ethnicity.municipality_id, Ethnicity.date_id),
+                 select(MotherTongue.municipality_id, MotherTongue.date_id),
+                 select(Religion.municipality_id, Religion.date_id)).subquery('k')
+
+    def _on(model):
+        return (model.municipality_id == keys.c.municipality_id) & (model.date_id == keys.c.date_id)
+
+    return select(keys.c.municipality_id, Municipality.district_id, keys.c.date_id,
+                  _year(Moment.date),
+                  Ethnicity.bulgarians.label('ethnic_bulgarians'), Ethnicity.turks.label('ethnic_turks'),
+                  Ethnicity.roma.label('ethnic_roma'), Ethnicity.other.label('ethnic_other'),
+                  MotherTongue.bulgarians.label('tongue_bulgarian'), MotherTongue.turks.label('tongue_turkish'),
+                  MotherTongue.roma.label('tongue_romani'), MotherTongue.other.label('tongue_other'),
+                  Religion.orthodox, Religion.muslims, Religion.judean,
+                  Religion.other.label('religion_other'), Religion.none.label('religion_none')) \
+        .select_from(keys) \
+        .join(Municipality, Municipality.id == keys.c.municipality_id) \
+        .join(Moment, Moment.id == keys.c.date_id) \
+        .outerjoin(Ethnicity, _on(Ethnicity)) \
+        .outerjoin(MotherTongue, _on(MotherTongue)) \
+        .outerjoin(Religion, _on(Religion))
+
+
+# name -> (comment, unique key columns, query). REFRESH ... CONCURRENTLY
+# needs a unique index on every view.
+VIEWS = {
+    'municipality_population': (
+        """
+            Брой на населението по постоянен и настоящ адрес на всяка община
+            към 31 декември на всяка година, сбор от таблицата census.
+        """,
+        ['municipality_id', 'date_id'],
+        _municipality_population),
+
+    'district_population': (
+        """
+            Брой на населението по постоянен и настоящ адрес на всяка област
+            към 31 декември на всяка година, сбор от таблицата census.
+        """,
+        ['district_id', 'date_id'],
+        _district_population),
+
+    'examination_average': (
+        """
+            Среден резултат на всяко учебно заведение по предмет, клас и
+            година, претеглен с броя на учениците от таблицата examination.
+        """,
+        ['institution_id', 'subject_id', 'grade', 'year'],
+        _examination_average),
+
+    'municipality_demography': (
+        """
+            Етническа принадлежност, майчин език и вероизповедание на
+            населението на всяка община при всяко преброяване, в проценти,
+            от таблиците ethnicity, mother_tongue и religion.
+        """,
+        ['municipality_id', 'date_id'],
+        _municipality_demography),
+}
+
+
+def _sql(engine, query) -> str:
+    return str(query().compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def create(engine) -> None:
+    """ Create the missing views, without data until the first refresh() """
+
+    if engine.dialect.name != 'postgresql':
+        return
+
+    with engine.begin() as conn:
+        for name, (comment, key, query) in VIEWS.items():
+            conn.execute(text(f'CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {_sql(engine, query)} WITH NO DATA'))
+            conn.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS uq_{name} ON {name} ({", ".join(key)})'))
+            comment = comment.replace("'", "''")
+            conn.execute(text(f"COMMENT ON MATERIALIZED VIEW {name} IS '{comment}'"))
+
+
+def refresh(engine, empty_only: bool = False) -> None:
+    """
+    Compute the views again, or with empty_only only those which have
+    never been computed. Once a view has data this is done CONCURRENTLY,
+    so queries keep reading the old rows meanwhile.
+    """
+
+    if engine.dialect.name != 'postgresql':
+        with engine.begin() as conn:
+            for name, (_, key, query) in VIEWS.items():
+                conn.execute(text(f'DROP TABLE IF EXISTS {name}'))
+                conn.execute(text(f'CREATE TABLE {name} AS {_sql(engine, query)}'))
+                conn.execute(text(f'CREATE UNIQUE INDEX uq_{name} ON {name} ({", ".join(key)})'))
+        return
+
+    with engine.begin() as conn:
+        populated = dict(conn.execute(text('SELECT matviewname, ispopulated FROM pg_matviews')).all())
+        for name in VIEWS:
+            if empty_only and populated.get(name):
+                continue
+            concurrently = 'CONCURRENTLY ' if populated.get(name) else ''
+            conn.execute(text(f'REFRESH MATERIALIZED VIEW {concurrently}{name}'))
+
+
+if __name__ == "__main__":
+
+    engine = create_engine()
+    create(engine)
+    refresh(engine)